@@ -1,4 +1,16 @@
-from .sensor import *
 from .tools import *
+from .lazy import *
+from . import tools, sensor, acquire, storage, dsp
+
+# the subpackages only list their names here, the sensor drivers and numpy
+# are loaded on first use
+__getattr__, __dir__, _lazy_names = lazy_loader(__name__, globals(), {
+    '.sensor': sensor.__all__,
+    '.acquire': acquire.__all__,
+    '.storage': storage.__all__,
+    '.dsp': dsp.__all__,
+}, submodules=('header', 'sim'))
+
+__all__ = tools.__all__ + _lazy_names
 
 __version__ = '0.1'
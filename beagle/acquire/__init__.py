@@ -0,0 +1,15 @@
+from ..lazy import *
+
+__getattr__, __dir__, __all__ = lazy_loader(__name__, globals(), {
+    '.scheduler': ['RateScheduler'],
+    '.clock': ['SampleClock'],
+    '.ring': ['RingBuffer'],
+    '.engine': ['Acquisition', 'mpu_motion_source', 'mpu_fifo_source', 'bmp_source'],
+    '.aio': ['AsyncMPU', 'AsyncBMP'],
+    '.multirate': ['MultiRateReader', 'multirate_channels'],
+    '.shmring': ['SharedRing'],
+    '.pipeline': ['Pipeline', 'LogStage'],
+    '.array': ['SensorArray'],
+    '.raw': ['RawCapture', 'CaptureDecoder', 'raw_channels'],
+    '.trigger': ['MotionDetector', 'WakeOnMotion', 'EventRecorder'],
+})
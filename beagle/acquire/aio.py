@@ -0,0 +1,107 @@
+from ..sensor.mpu9250 import *
+from ..sensor.bmp280 import *
+import asyncio
+import concurrent.futures
+import functools
+import time
+
+__all__ = ['AsyncMPU', 'AsyncBMP']
+
+
+class _AsyncSensor(object):
+
+    def __init__(self, sensor, executor=None):
+        # one worker per sensor keeps its bus transactions in order while
+        # the event loop stays free
+        self.sensor = sensor
+        self._closed = False
+        self._own_executor = executor is None
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @classmethod
+    async def _open(cls, factory, args, kwargs, executor):
+        # construct the sensor, reset sleeps and all, off the loop
+        pool = executor or concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        sensor = await loop.run_in_executor(pool, functools.partial(factory, *args, **kwargs))
+        obj = cls(sensor, pool)
+        obj._own_executor = executor is None
+        return obj
+
+    async def call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def close(self):
+        self._closed = True
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class AsyncMPU(_AsyncSensor):
+
+    @classmethod
+    async def open(cls, *args, executor=None, **kwargs):
+        return await cls._open(MPU, args, kwargs, executor)
+
+    async def read_motion(self, mag=False):
+        return await self.call(self.sensor.mpu_read_motion, mag)
+
+    async def read_fifo(self):
+        return await self.call(self.sensor.mpu_read_fifo)
+
+    async def stream(self, rate=None, interval=0.05):
+        # drain the fifo every interval and yield the batches, the interval
+        # is capped at half the time it takes the fifo to fill up
+        if rate is not None:
+            await self.call(self.sensor.mpu_set_sample_rate, rate)
+        await self.call(self.sensor.mpu_fifo_start)
+        interval = min(interval, 0.5 * self.sensor.mpu_fifo_fill_time())
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                batch = await self.read_fifo()
+                batch['timestamp'] = time.time()
+                if len(batch['accel']) or batch['overflow']:
+                    yield batch
+        finally:
+            # an abandoned stream is only finalized later, possibly after
+            # the executor was shut down
+            if self._closed:
+                self.sensor.mpu_fifo_stop()
+            else:
+                await self.call(self.sensor.mpu_fifo_stop)
+
+
+class AsyncBMP(_AsyncSensor):
+
+    @classmethod
+    async def open(cls, *args, executor=None, **kwargs):
+        return await cls._open(BMP, args, kwargs, executor)
+
+    async def read(self):
+        return await self.call(self.sensor.bmp_read)
+
+    async def stream(self, rate=25.0):
+        # one sample per period on a fixed monotonic grid
+        loop = asyncio.get_running_loop()
+        period = 1.0 / rate
+        deadline = loop.time()
+        while True:
+            data = await self.read()
+            data['timestamp'] = time.time()
+            yield data
+
+            deadline += period
+            delay = deadline - loop.time()
+            if delay < 0:
+                # late, skip the periods that went by
+                deadline += period * (int(-delay / period) + 1)
+                delay = deadline - loop.time()
+            await asyncio.sleep(delay)
@@ -0,0 +1,238 @@
+from ..header import *
+from ..storage.binlog import *
+from ..sensor.mpu9250 import *
+from ..sensor.bmp280 import *
+from .scheduler import *
+from .clock import *
+import threading
+import time
+
+__all__ = ['SensorArray']
+
+IMU_KEYS = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+MAG_KEYS = ('mx', 'my', 'mz')
+BARO_KEYS = ('temp', 'pressure', 'altitude')
+UNITS = dict(zip(IMU_KEYS + MAG_KEYS + BARO_KEYS,
+                 ['m/s^2'] * 3 + ['deg/s'] * 3 + ['uT'] * 3 + ['C', 'hPa', 'm']))
+
+
+class _Member(object):
+
+    # one sensor of the array with its health counters
+
+    def __init__(self, name, sensor, mag, tick):
+        self.name = name
+        self.sensor = sensor
+        self.mag = False
+        if isinstance(sensor, BMP):
+            self.keys = BARO_KEYS
+            self.period = 1.0 / sensor.bmp_sample_rate()
+            self._read = sensor.bmp_read
+        else:
+            self.keys = IMU_KEYS
+            self.period = 0.0
+            self._read = sensor.mpu_read_motion
+            # half a tick short of the AK8963 period, so rounding never
+            # pushes a read a tick late. The I2C master always has the
+            # latest measurement, a bypass read before the next one is
+            # ready gets None and is tried again on the next tick
+            self.mag = mag
+            self.mag_period = 1.0 / MAG_CONT_MES_2_RATE - tick / 2.0
+        self.values = (0.0,) * len(self.keys)
+        self.new = 0
+        self.next_read = 0.0
+        self.mag_values = (0.0,) * 3
+        self.mag_new = 0
+        self.next_mag = 0.0
+
+        self.reads = 0
+        self.errors = 0
+        self.failing = 0
+        self.last_error = None
+        self.latency = 0.0
+        self.first = None
+        self.last = None
+
+    @property
+    def channel_keys(self):
+        return self.keys + (MAG_KEYS if self.mag else ())
+
+    @property
+    def flag_names(self):
+        return ('new', 'mag_new') if self.mag else ('new',)
+
+    def row(self):
+        if self.mag:
+            return self.values + self.mag_values + (self.new, self.mag_new)
+        return self.values + (self.new,)
+
+    def __call(self, fn):
+        t0 = time.monotonic()
+        try:
+            data = fn()
+        except IOError as e:
+            self.errors += 1
+            self.failing += 1
+            self.last_error = e
+            return None
+        finally:
+            self.latency = time.monotonic() - t0
+        self.failing = 0
+        return data if isinstance(data, dict) else None
+
+    def poll(self, t):
+        # sensors slower than the array, the barometers and magnetometers,
+        # are read at their own rate and held in between
+        self.new = 0
+        self.mag_new = 0
+        if t >= self.next_read:
+            t0 = time.monotonic()
+            data = self.__call(self._read)
+            if data is not None:
+                self.values = tuple(data[k] for k in self.keys)
+                self.new = 1
+                self.reads += 1
+                self.first = self.first or t0
+                self.last = t0
+                self.next_read = t + self.period
+
+        # None while the AK8963 has no new measurement, tried again next tick
+        if self.mag and t >= self.next_mag:
+            data = self.__call(self.sensor.mpu_poll_mag)
+            if data is not None:
+                self.mag_values = tuple(data[k] for k in MAG_KEYS)
+                self.mag_new = 1
+                self.next_mag = t + self.mag_period
+
+    def health(self):
+        span = (self.last - self.first) if self.reads > 1 else 0.0
+        return {'reads': self.reads, 'errors': self.errors, 'failing': self.failing,
+                'last_error': repr(self.last_error) if self.last_error is not None else None,
+                'rate': (self.reads - 1) / span if span > 0 else 0.0,
+                'latency': self.latency}
+
+
+class SensorArray(object):
+
+    # several MPUs and BMPs read together. Every tick each bus has a worker
+    # thread read the sensors on it, the I2C transfers of different buses
+    # release the GIL and overlap, and the results become one row. Sensors
+    # are grouped by the bus they were opened on, sensors that share a bus
+    # are read one after the other.
+    #
+    # sensors is a list of (name, sensor) pairs, the channels are named
+    # <name>_<key> with a <name>_new flag for rows with a fresh reading,
+    # and a <name>_mag_new flag for the magnetometer of an MPU.
+
+    def __init__(self, sensors, rate, mag=False):
+        self._sched = RateScheduler(rate)
+        self._members = [_Member(name, s, mag, self._sched.period) for name, s in sensors]
+        self._clock = SampleClock(rate)
+        self._missed = 0
+
+        # one worker per bus number, or per bus object when one was passed
+        groups = {}
+        for m in self._members:
+            bus = m.sensor._bus_id
+            key = bus if isinstance(bus, int) else id(bus)
+            groups.setdefault(key, []).append(m)
+        self._groups = list(groups.values())
+
+        channels = [log_channel('timestamp', '<f8', unit='s')]
+        for m in self._members:
+            channels += [log_channel('%s_%s' % (m.name, k), unit=UNITS[k]) for k in m.channel_keys]
+            channels += [log_channel('%s_%s' % (m.name, f), '<u1') for f in m.flag_names]
+        self.channels = channels
+
+        self._cond = threading.Condition()
+        self._tick = 0
+        self._tick_time = 0.0
+        self._done = 0
+        self._stop = False
+        self._threads = []
+
+    @property
+    def dtype(self):
+        return log_dtype(self.channels)
+
+    @property
+    def scheduler(self):
+        return self._sched
+
+    @property
+    def buses(self):
+        return len(self._groups)
+
+    def __work(self, members):
+        seen = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop or self._tick != seen)
+                if self._stop:
+                    return
+                seen = self._tick
+                t = self._tick_time
+
+            for m in members:
+                m.poll(t)
+
+            # a bus that overran its tick does not count for the next one
+            with self._cond:
+                if seen == self._tick:
+                    self._done += 1
+                self._cond.notify_all()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop = False
+        for i, members in enumerate(self._groups):
+            th = threading.Thread(target=self.__work, args=(members,), name='beagle-array-%d' % i)
+            th.daemon = True
+            th.start()
+            self._threads.append(th)
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for th in self._threads:
+            th.join()
+        self._threads = []
+
+    def read(self):
+        # one tick: every bus reads at the same moment, a bus that is not
+        # done within the period leaves its sensors' last values in the row
+        if not self._threads:
+            self.start()
+        t = self._sched.wait()
+        missed = self._sched.missed
+        ts = self._clock.stamp_one(time.monotonic(), missed - self._missed)
+        self._missed = missed
+
+        with self._cond:
+            self._tick += 1
+            self._tick_time = t
+            self._done = 0
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._done == len(self._groups),
+                                t + self._sched.period - time.monotonic())
+
+            row = (ts,)
+            for m in self._members:
+                row += m.row()
+        return row
+
+    def source(self):
+        # for Acquisition, read() paces itself
+        return self.dtype, self.read
+
+    def health(self):
+        return dict((m.name, m.health()) for m in self._members)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,117 @@
+import time
+import numpy as np
+
+__all__ = ['SampleClock']
+
+
+class SampleClock(object):
+
+    # times samples by their index on the sensor's own sample clock rather
+    # than by when the host got around to reading them. Every read gives
+    # one observation (index of the newest sample, host time), a linear
+    # fit through them with exponential forgetting follows the drift
+    # between the two oscillators, and sample times come from the fit so
+    # bus latency jitter averages out. Reads can only be late, never
+    # early, so the fit is moved down to the lower edge of the
+    # observations, which leaves just the smallest read latency. Times are
+    # host monotonic seconds moved onto the wall clock once, at the start,
+    # so NTP steps during a run do not show up as jumps.
+
+    def __init__(self, rate, forget=0.999, clock=time.monotonic, wall=time.time):
+        self._nominal = 1.0 / rate
+        self._forget = forget
+        self._clock = clock
+        self.epoch_offset = wall() - clock()
+        self.reset()
+
+    def reset(self):
+        self._index = -1
+        self._w = 0.0
+        self._mx = 0.0
+        self._my = 0.0
+        self._cxx = 0.0
+        self._cxy = 0.0
+        self._floor = 0.0
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def period(self):
+        # the fitted period, the nominal one until the fit has a spread of
+        # a few samples to go by
+        if self._cxx > 4.0 * self._w:
+            return self._cxy / self._cxx
+        return self._nominal
+
+    @property
+    def rate(self):
+        return 1.0 / self.period
+
+    @property
+    def drift_ppm(self):
+        return (self.period / self._nominal - 1.0) * 1e6
+
+    def __fit(self, index):
+        return self._my + self.period * (index - self._mx)
+
+    def __observe(self, x, y):
+        # the lowest residual once the fit has settled, slowly let go of
+        # so it follows a change
+        if self._w >= 100.0:
+            r = y - self.__fit(x)
+            self._floor = min(r, self._floor + self._nominal * 1e-4)
+
+        # exponentially weighted running means and co-moments
+        lw = self._forget * self._w
+        w = lw + 1.0
+        dx = x - self._mx
+        dy = y - self._my
+        self._mx += dx / w
+        self._my += dy / w
+        self._cxx = self._forget * self._cxx + lw / w * dx * dx
+        self._cxy = self._forget * self._cxy + lw / w * dx * dy
+        self._w = w
+
+    def predict(self, index):
+        # host monotonic time of a sample index
+        if self._w == 0.0:
+            return None
+        return self.__fit(index) + self._floor
+
+    def __advance(self, n, t, gap):
+        if self._index < 0:
+            self._index += n
+        elif gap:
+            # samples were lost, count them from the elapsed time
+            k = int((t - self.predict(self._index)) / self.period + 0.25)
+            self._index += max(n, k)
+        else:
+            self._index += n
+        self.__observe(float(self._index), t)
+
+    def stamp(self, n, t=None, gap=False):
+        # epoch times of a batch of n samples whose newest one was in the
+        # sensor at host time t, such as the moment FIFO_COUNT was read
+        t = self._clock() if t is None else t
+        if n <= 0:
+            return np.zeros(0)
+        self.__advance(n, t, gap)
+        first = self.predict(self._index - n + 1)
+        return first + self.period * np.arange(n) + self.epoch_offset
+
+    def extend(self, n):
+        # n more samples straight after the last ones, when the read time
+        # says nothing about them, such as the frames of an overflowed fifo
+        if self._w == 0.0 or n <= 0:
+            return np.zeros(0)
+        self._index += n
+        return self.predict(self._index - n + 1) + self.period * np.arange(n) + self.epoch_offset
+
+    def stamp_one(self, t=None, skipped=0):
+        # one sample read right after its data ready flag, skipped is the
+        # number of samples that went by unread since the last one
+        t = self._clock() if t is None else t
+        self.__advance(1 + skipped, t, False)
+        return self.predict(self._index) + self.epoch_offset
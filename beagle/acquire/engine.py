@@ -0,0 +1,157 @@
+from ..storage.binlog import *
+from .ring import *
+from .scheduler import *
+from .clock import *
+import threading
+import time
+import numpy as np
+
+__all__ = ['Acquisition', 'mpu_motion_source', 'mpu_fifo_source', 'bmp_source']
+
+
+def _key(name):
+    # log channel names to sensor dict keys
+    return name[4:] if name.startswith('imu_') else name
+
+
+def mpu_motion_source(mpu, mag=False):
+    # one record per call from a single burst read
+    channels = IMU10_CHANNELS if mag else IMU6_CHANNELS
+    keys = [_key(c['name']) for c in channels[1:]]
+
+    def read():
+        data = mpu.mpu_read_motion(mag=mag)
+        return (time.time(),) + tuple(data[k] for k in keys)
+
+    return log_dtype(channels), read
+
+
+def mpu_fifo_source(mpu):
+    # every frame waiting in the fifo, timed on the sensor's sample clock
+    dtype = log_dtype(IMU6_CHANNELS)
+    rate = mpu.mpu_scales()['sample_rate']
+    state = {'gap': False, 'rate': rate, 'clock': SampleClock(rate)}
+
+    def read():
+        data = mpu.mpu_read_fifo()
+        n = len(data['accel'])
+        records = np.empty(n, dtype=dtype)
+        if data['scales']['sample_rate'] != state['rate']:
+            # mpu_configure() changed the rate, the frames start a new clock
+            state['rate'] = data['scales']['sample_rate']
+            state['clock'] = SampleClock(state['rate'])
+        clock = state['clock']
+        if data['overflow'] and clock.index >= 0:
+            # the frames follow on from the last batch, the ones after
+            # them are lost
+            records['timestamp'] = clock.extend(n)
+            state['gap'] = True
+        elif n:
+            records['timestamp'] = clock.stamp(n, data['read_time'], state['gap'])
+            state['gap'] = False
+        for i, a in enumerate('xyz'):
+            records['imu_a' + a] = data['accel'][:, i]
+            records['imu_g' + a] = data['gyro'][:, i]
+        return records
+
+    return dtype, read
+
+
+def bmp_source(bmp):
+    keys = [c['name'] for c in BARO_CHANNELS[1:]]
+
+    def read():
+        data = bmp.bmp_read()
+        return (time.time(),) + tuple(data[k] for k in keys)
+
+    return log_dtype(BARO_CHANNELS), read
+
+
+class Acquisition(object):
+
+    def __init__(self, source, capacity=65536, rate=None, ready=None, interval=None):
+        # source is a (dtype, read) pair, read() returns either one record as
+        # a tuple or a structured array of records. Give a rate to pace
+        # per-sample reads, or an interval to poll batch sources.
+        self._dtype, self._read = source
+        self.ring = RingBuffer(capacity, self._dtype)
+        self._sched = RateScheduler(rate, ready=ready) if rate else None
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.errors = 0
+        self.last_error = None
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def overruns(self):
+        return self.ring.overruns
+
+    @property
+    def missed(self):
+        return self._sched.missed if self._sched is not None else 0
+
+    def __run(self):
+        while not self._stop.is_set():
+            if self._sched is not None:
+                self._sched.wait()
+            elif self._interval:
+                self._stop.wait(self._interval)
+
+            try:
+                records = self._read()
+            except IOError as e:
+                self.errors += 1
+                self.last_error = e
+                continue
+
+            if isinstance(records, tuple):
+                self.ring.write_row(records)
+            else:
+                self.ring.write(records)
+
+        self.ring.wake()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.__run, name='beagle-acquisition')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None
+
+    def peek(self, max_rows=None, timeout=None):
+        return self.ring.peek(max_rows, timeout)
+
+    def advance(self, n):
+        self.ring.advance(n)
+
+    def batches(self, max_rows=None, timeout=0.1):
+        # views of the ring, each one is released once the caller asks for
+        # the next, until the acquisition is stopped and drained
+        while self.running() or len(self.ring):
+            view = self.ring.peek(max_rows, timeout)
+            if len(view):
+                yield view
+                self.ring.advance(len(view))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
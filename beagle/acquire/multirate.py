@@ -0,0 +1,111 @@
+from ..header import *
+from ..storage.binlog import *
+from .scheduler import *
+from .clock import *
+import time
+
+__all__ = ['MultiRateReader', 'multirate_channels']
+
+IMU_KEYS = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+MAG_KEYS = ('mx', 'my', 'mz')
+BARO_KEYS = ('temp', 'pressure', 'altitude')
+
+
+def multirate_channels(temp=False, mag=True, baro=False):
+    # the row layout of MultiRateReader, known before the sensors are up
+    channels = [log_channel('timestamp', '<f8', unit='s')]
+    if temp:
+        channels += [log_channel('temp', unit='C')]
+    channels += IMU6_CHANNELS[1:]
+    if mag:
+        channels += IMU10_CHANNELS[-3:] + [log_channel('mag_new', '<u1')]
+    if baro:
+        channels += [log_channel('baro_temp', unit='C')] + BARO_CHANNELS[2:] + \
+                    [log_channel('baro_new', '<u1')]
+    return channels
+
+
+class MultiRateReader(object):
+
+    # reads the IMU every tick and the magnetometer and barometer only when
+    # they have produced new data, their last values are held in between and
+    # the mag_new/baro_new columns mark the rows where they were refreshed
+
+    def __init__(self, mpu, bmp=None, rate=None, temp=False, mag=True,
+                 mag_rate=MAG_CONT_MES_2_RATE, baro_rate=None, ready=None, stats=None):
+        self._mpu = mpu
+        self._bmp = bmp
+        self._temp = temp
+        self._mag = mag
+
+        rate = rate or mpu.mpu_scales()['sample_rate']
+        self._sched = RateScheduler(rate, ready=ready, stats=stats)
+        self._clock = SampleClock(rate)
+        self._missed = 0
+        self._mag_period = 1.0 / mag_rate
+        baro_rate = baro_rate or (bmp.bmp_sample_rate() if bmp is not None else 1.0)
+        self._baro_period = 1.0 / baro_rate
+        self._next_mag = 0.0
+        self._next_baro = 0.0
+        self._mag_held = (0.0, 0.0, 0.0)
+        self._baro_held = (0.0, 0.0, 0.0)
+
+        self.channels = multirate_channels(temp, mag, bmp is not None)
+
+    @property
+    def dtype(self):
+        return log_dtype(self.channels)
+
+    @property
+    def scheduler(self):
+        return self._sched
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def _tick(self):
+        # the sample just became ready, so its time comes off the sample
+        # clock, counting the ticks the scheduler had to skip
+        t = self._sched.wait()
+        missed = self._sched.missed
+        ts = self._clock.stamp_one(time.monotonic(), missed - self._missed)
+        self._missed = missed
+        return t, ts
+
+    def read(self):
+        t, ts = self._tick()
+        motion = self._mpu.mpu_read_motion()
+
+        row = (ts,)
+        if self._temp:
+            row += (motion['temp'],)
+        row += tuple(motion[k] for k in IMU_KEYS)
+
+        if self._mag:
+            new = 0
+            if t >= self._next_mag:
+                mag = self._mpu.mpu_poll_mag()
+                if mag is not None:
+                    # not ready yet means retrying on the next tick, once
+                    # it is, aim a tick early for the following one
+                    self._mag_held = tuple(mag[k] for k in MAG_KEYS)
+                    self._next_mag = t + self._mag_period - self._sched.period
+                    new = 1
+            row += self._mag_held + (new,)
+
+        if self._bmp is not None:
+            new = 0
+            if t >= self._next_baro:
+                baro = self._bmp.bmp_read()
+                if isinstance(baro, dict):
+                    self._baro_held = tuple(baro[k] for k in BARO_KEYS)
+                    new = 1
+                self._next_baro = t + self._baro_period - self._sched.period / 2.0
+            row += self._baro_held + (new,)
+
+        return row
+
+    def source(self):
+        # for Acquisition, read() paces itself
+        return self.dtype, self.read
@@ -0,0 +1,222 @@
+from ..storage.binlog import *
+from ..storage.csvlog import *
+from ..storage.rotate import *
+from .scheduler import *
+from .shmring import *
+import gc
+import multiprocessing
+import signal
+from multiprocessing import resource_tracker
+
+__all__ = ['Pipeline', 'LogStage']
+
+
+class LogStage(object):
+
+    # the last stage of a Pipeline, records into a RotatingLog. Without
+    # channels they are made up from the dtype, without units
+
+    def __init__(self, dtype, prefix, channels=None, fmt='bin', sample_rate=None,
+                 calibration=None, meta=None, **rotate):
+        if channels is None:
+            channels = [log_channel(n, dtype[n].str) for n in dtype.names]
+
+        if fmt == 'bin':
+            def opener(path):
+                return BinLogWriter(path, channels, sample_rate=sample_rate,
+                                    calibration=calibration, meta=meta)
+            suffix = '.blog'
+        else:
+            def opener(path):
+                return CsvLogWriter(path, channels)
+            suffix = '.csv'
+        self.log = RotatingLog(prefix, suffix, opener, **rotate)
+
+    def process(self, records):
+        self.log.write(records)
+
+    def close(self):
+        self.log.close()
+
+
+def _collect(factory, kwargs, rate, interval, conn, lock, stop):
+    # runs in the collector process: owns the sensors, the bus and nothing
+    # else. Everything built during setup is frozen out of the garbage
+    # collector and automatic collection is off, reference counting still
+    # frees the per read garbage, so there are no collector pauses. Ctrl-C
+    # is left to the parent, which stops the pipeline in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        dtype, read = factory(**kwargs)
+    except Exception as e:
+        conn.send(('error', repr(e)))
+        return
+    conn.send(('dtype', dtype))
+    ring = SharedRing.attach(conn.recv(), lock)
+
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+
+    sched = RateScheduler(rate) if rate else None
+    try:
+        while not stop.is_set():
+            if sched is not None:
+                sched.wait()
+            elif interval:
+                stop.wait(interval)
+
+            try:
+                records = read()
+            except IOError:
+                ring.count_error()
+                continue
+
+            if isinstance(records, tuple):
+                ring.write_row(records)
+            else:
+                ring.write(records)
+    finally:
+        ring.close_writer()
+        ring.release()
+
+
+def _stage(factory, kwargs, spec_in, lock_in, spec_out, lock_out, max_rows):
+    # runs in a stage process until its input is closed and drained
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    src = SharedRing.attach(spec_in, lock_in)
+    dst = SharedRing.attach(spec_out, lock_out)
+    stage = factory(src.dtype, **kwargs)
+    try:
+        while True:
+            closed = src.closed
+            view = src.peek(max_rows, timeout=0.05)
+            if len(view) == 0:
+                if closed:
+                    break
+                continue
+
+            out = stage.process(view)
+            src.advance(len(view))
+            if out is not None and len(out):
+                dst.write(out)
+            del view
+    finally:
+        close = getattr(stage, 'close', None)
+        if close is not None:
+            close()
+        dst.close_writer()
+        dst.release()
+        src.release()
+
+
+class Pipeline(object):
+
+    # acquisition split over processes: a collector process owns the bus
+    # and does nothing but read sensors into a shared memory ring, each
+    # stage (filtering, encoding, writing the log) runs in a process of its
+    # own behind another ring. A stall in a stage only fills its ring, the
+    # collector keeps its timing.
+    #
+    # source is (factory, kwargs), called in the collector to bring the
+    # sensors up and return a (dtype, read) source as for Acquisition, so
+    # it has to be a module level function. Each stage is (factory, kwargs),
+    # called as factory(dtype, **kwargs) in the stage process, returning an
+    # object with process(records), which returns the records for the next
+    # stage, and optionally close(). Decimator and LogStage fit that. The
+    # stages keep the record dtype of the source, whatever the last stage
+    # returns can be picked up with read().
+
+    def __init__(self, source, stages=(), capacity=65536, rate=None, interval=None,
+                 max_rows=4096, context=None):
+        self._source = source
+        self._stages = list(stages)
+        self._capacity = capacity
+        self._rate = rate
+        self._interval = interval
+        self._max_rows = max_rows
+        self._ctx = multiprocessing.get_context(context)
+        self._procs = []
+        self._rings = []
+        self.dtype = None
+
+    @property
+    def overruns(self):
+        # records dropped in front of each stage
+        return [r.overruns for r in self._rings]
+
+    @property
+    def backlog(self):
+        return [len(r) for r in self._rings]
+
+    @property
+    def errors(self):
+        return self._rings[0].errors if self._rings else 0
+
+    def start(self, timeout=30.0):
+        if self._procs:
+            return
+        ctx = self._ctx
+        self._stop = ctx.Event()
+
+        # every process inherits this tracker, none of them removes the
+        # shared memory behind the others' backs when it exits
+        resource_tracker.ensure_running()
+
+        locks = [ctx.Lock() for i in range(len(self._stages) + 1)]
+        parent, child = ctx.Pipe()
+
+        factory, kwargs = self._source
+        collector = ctx.Process(target=_collect, name='beagle-collector',
+                                args=(factory, kwargs, self._rate, self._interval, child, locks[0], self._stop))
+        collector.daemon = True
+        collector.start()
+        self._procs.append(collector)
+
+        # the collector brings the sensors up and reports the record layout
+        if not parent.poll(timeout):
+            self.stop()
+            raise IOError('the collector did not start')
+        kind, value = parent.recv()
+        if kind == 'error':
+            self.stop()
+            raise IOError('the collector failed to start: %s' % value)
+        self.dtype = value
+
+        self._rings = [SharedRing(self._capacity, self.dtype, lock) for lock in locks]
+        parent.send(self._rings[0].spec())
+
+        for i, (factory, kwargs) in enumerate(self._stages):
+            p = ctx.Process(target=_stage, name='beagle-stage-%d' % i,
+                            args=(factory, kwargs, self._rings[i].spec(), locks[i],
+                                  self._rings[i + 1].spec(), locks[i + 1], self._max_rows))
+            p.daemon = True
+            p.start()
+            self._procs.append(p)
+
+    def stop(self, timeout=None):
+        # the collector stops reading, each stage drains its ring and exits
+        if not self._procs:
+            return
+        self._stop.set()
+        for p in self._procs:
+            p.join(timeout)
+        self._procs = []
+        for r in self._rings:
+            r.release()
+        self._rings = []
+
+    def read(self, max_rows=None, timeout=None):
+        # a copy of what came out of the last stage, or of the collector
+        # without stages
+        return self._rings[-1].read(max_rows, timeout)
+
+    def running(self):
+        return any(p.is_alive() for p in self._procs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
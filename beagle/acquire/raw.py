@@ -0,0 +1,160 @@
+from ..storage.binlog import *
+from ..sensor.decode import *
+from ..sensor.calibration import *
+from ..sensor.bmp280 import _constants, _compensate_array
+from .multirate import *
+import numpy as np
+
+__all__ = ['RawCapture', 'CaptureDecoder', 'raw_channels']
+
+
+def raw_channels(mag=True, baro=False):
+    # the register windows as they came off the bus, opaque bytes
+    channels = [log_channel('timestamp', '<f8', unit='s'),
+                log_channel('motion', 'V%d' % MOTION_FRAME.itemsize)]
+    if mag:
+        channels += [log_channel('mag', 'V%d' % MAG_FRAME.itemsize), log_channel('mag_new', '<u1')]
+    if baro:
+        channels += [log_channel('baro', 'V%d' % BMP_FRAME.itemsize), log_channel('baro_new', '<u1')]
+    return channels
+
+
+class RawCapture(MultiRateReader):
+
+    # MultiRateReader that keeps the register bytes rather than decoding
+    # them, a row costs the bus transfers and a copy. decode_capture() turns
+    # the rows into the ones MultiRateReader would have read, given meta(),
+    # which is taken once, so the scales must not be changed with
+    # mpu_configure() during a capture
+
+    def __init__(self, mpu, bmp=None, rate=None, temp=False, mag=True, **kwargs):
+        MultiRateReader.__init__(self, mpu, bmp, rate, temp, mag, **kwargs)
+        self._mag_held = bytes(MAG_FRAME.itemsize)
+        self._baro_held = bytes(BMP_FRAME.itemsize)
+        self.channels = raw_channels(mag, bmp is not None)
+
+    def meta(self):
+        raw = {'temp': self._temp, 'scales': self._mpu.mpu_scales()}
+        if self._bmp is not None:
+            raw['bmp280'] = self._bmp.bmp_calibration()
+        return {'raw': raw}
+
+    def read(self):
+        t, ts = self._tick()
+        row = (ts, self._mpu.mpu_read_motion_raw())
+
+        if self._mag:
+            new = 0
+            if t >= self._next_mag:
+                mag = self._mpu.mpu_poll_mag_raw()
+                if mag is not None:
+                    self._mag_held = mag
+                    self._next_mag = t + self._mag_period - self._sched.period
+                    new = 1
+            row += (self._mag_held, new)
+
+        if self._bmp is not None:
+            new = 0
+            if t >= self._next_baro:
+                self._baro_held = self._bmp.bmp_read_raw()
+                new = 1
+                self._next_baro = t + self._baro_period - self._sched.period / 2.0
+            row += (self._baro_held, new)
+
+        return row
+
+
+def _round(x, n):
+    # python's round(x, n) for every element. numpy scales by 10**n before
+    # rounding, which can tip a value sitting on a tie the other way, so
+    # those few are done by python
+    y = np.round(x, n)
+    s = x * 10.0 ** n
+    for i in np.flatnonzero(np.abs(s - np.floor(s) - 0.5) < 1e-6):
+        y.flat[i] = round(float(x.flat[i]), n)
+    return y
+
+
+def _bytes(field):
+    return np.ascontiguousarray(field).tobytes()
+
+
+class CaptureDecoder(object):
+
+    # RawCapture rows into the rows MultiRateReader would have read, with
+    # the same values, rounding included. raw is meta()['raw'] as stored in
+    # the log header, process() takes the rows block by block
+
+    def __init__(self, raw, mag=True, baro=False):
+        scales = raw['scales']
+        self._accel_to_ms2 = scales['accel_to_ms2']
+        self._gyro_to_degs = scales['gyro_to_degs']
+        self._mag_adjust = scales['mag_factory_adjust']
+        self._mag_ready = not scales.get('mag_master', False)
+        cal = scales.get('calibration')
+        self._cal = Calibration.from_dict(cal) if cal is not None else None
+        self._temp = raw['temp']
+        self._mag = mag
+        self._baro = baro
+        if baro:
+            self._comp = _constants(raw['bmp280'])
+            self._inv_sea_level_pa = 1.0 / raw['bmp280']['sea_level_pa']
+        self._baro_held = (0.0, 0.0, 0.0)
+
+        self.channels = multirate_channels(self._temp, mag, baro)
+
+    @property
+    def dtype(self):
+        return log_dtype(self.channels)
+
+    def process(self, records):
+        cal = self._cal
+        out = np.zeros(len(records), dtype=self.dtype)
+        out['timestamp'] = records['timestamp']
+
+        motion = decode_motion(_bytes(records['motion']), self._accel_to_ms2, self._gyro_to_degs)
+        if cal is not None:
+            cal.apply(motion)
+        if self._temp:
+            out['temp'] = _round(motion['temp'], 2)
+        accel = _round(motion['accel'], 4)
+        gyro = _round(motion['gyro'], 4)
+        for i, a in enumerate('xyz'):
+            out['imu_a' + a] = accel[:, i]
+            out['imu_g' + a] = gyro[:, i]
+
+        # the held bytes decode to the held values, so every row stands alone
+        if self._mag:
+            m = decode_mag(_bytes(records['mag']), self._mag_adjust, require_ready=self._mag_ready)
+            if cal is not None:
+                m = cal.mag(m)
+            m = _round(m, 4)
+            for i, a in enumerate('xyz'):
+                out['imu_m' + a] = m[:, i]
+            out['mag_new'] = records['mag_new']
+
+        # except for the barometer, where a reading that failed to compensate
+        # keeps the values before it
+        if self._baro:
+            new = np.flatnonzero(records['baro_new'])
+            adc_P, adc_T = decode_bmp_adc(_bytes(records['baro'][new]))
+            temp_c, pressure_pa = _compensate_array(self._comp, adc_P, adc_T)
+            good = ~np.isnan(pressure_pa)
+            new = new[good]
+            temp_c = temp_c[good]
+            pressure_pa = pressure_pa[good]
+            # pow() one at a time, numpy's may differ in the last bit
+            ratio = (pressure_pa * self._inv_sea_level_pa).tolist()
+            alt_m = 44330.0 * (1.0 - np.array([pow(r, 0.1903) for r in ratio], dtype=np.float64))
+
+            held = np.vstack([self._baro_held, np.column_stack([temp_c, pressure_pa / 100.0, alt_m])])
+            last = np.zeros(len(records), dtype=np.intp)
+            last[new] = np.arange(1, len(new) + 1)
+            last = held[np.maximum.accumulate(last)]
+            out['baro_temp'] = last[:, 0]
+            out['pressure'] = last[:, 1]
+            out['altitude'] = last[:, 2]
+            out['baro_new'][new] = 1
+            self._baro_held = tuple(held[-1])
+
+        return out
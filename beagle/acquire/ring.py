@@ -0,0 +1,101 @@
+import threading
+import numpy as np
+
+__all__ = ['RingBuffer']
+
+
+class RingBuffer(object):
+
+    # single producer, single consumer ring of preallocated records. The
+    # consumer gets views straight into the buffer, so when it falls behind
+    # new records are dropped and counted rather than overwriting records
+    # that may still be in use.
+
+    def __init__(self, capacity, dtype):
+        self._buf = np.zeros(capacity, dtype=dtype)
+        self._capacity = capacity
+        self._head = 0
+        self._tail = 0
+        self._cond = threading.Condition()
+        self.overruns = 0
+
+    @property
+    def dtype(self):
+        return self._buf.dtype
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._head - self._tail
+
+    @property
+    def written(self):
+        return self._head
+
+    def write(self, records):
+        with self._cond:
+            free = self._capacity - (self._head - self._tail)
+        n = len(records)
+        if n > free:
+            self.overruns += n - free
+            n = free
+        if n == 0:
+            return 0
+
+        # the slots between head and tail are ours until head moves
+        i = self._head % self._capacity
+        k = min(n, self._capacity - i)
+        self._buf[i:i + k] = records[:k]
+        self._buf[:n - k] = records[k:n]
+
+        with self._cond:
+            self._head += n
+            self._cond.notify_all()
+        return n
+
+    def write_row(self, row):
+        with self._cond:
+            full = self._head - self._tail >= self._capacity
+        if full:
+            self.overruns += 1
+            return 0
+
+        self._buf[self._head % self._capacity] = row
+
+        with self._cond:
+            self._head += 1
+            self._cond.notify_all()
+        return 1
+
+    def peek(self, max_rows=None, timeout=None):
+        # view of the oldest unread records, at most up to the end of the
+        # buffer, hand them back with advance() once done with them
+        with self._cond:
+            if self._head == self._tail and timeout != 0:
+                self._cond.wait_for(lambda: self._head != self._tail, timeout)
+            avail = self._head - self._tail
+
+        i = self._tail % self._capacity
+        n = min(avail, self._capacity - i)
+        if max_rows is not None:
+            n = min(n, max_rows)
+        return self._buf[i:i + n]
+
+    def advance(self, n):
+        with self._cond:
+            if n > self._head - self._tail:
+                raise ValueError('cannot advance past unread records')
+            self._tail += n
+
+    def read(self, max_rows=None, timeout=None):
+        # copying variant of peek() and advance()
+        view = self.peek(max_rows, timeout)
+        out = view.copy()
+        self.advance(len(out))
+        return out
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
@@ -0,0 +1,86 @@
+import time
+
+__all__ = ['RateScheduler']
+
+
+class RateScheduler(object):
+
+    def __init__(self, rate, ready=None, clock=time.monotonic, sleep=time.sleep, stats=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self._period = 1.0 / rate
+        self._ready = ready
+        self._clock = clock
+        self._sleep = sleep
+        self._deadline = None
+        self._stats = stats
+
+        self.ticks = 0
+        self.missed = 0
+        self.not_ready = 0
+        self.max_jitter = 0.0
+
+    @property
+    def period(self):
+        return self._period
+
+    def __sleep_until(self, t):
+        # sleep in the OS rather than spin, the remaining error is the
+        # scheduler wake-up latency
+        while True:
+            dt = t - self._clock()
+            if dt <= 0:
+                return
+            self._sleep(dt)
+
+    def __poll_ready(self):
+        # the data is due now, poll the ready flag with short sleeps until
+        # it shows up or the next deadline arrives
+        timeout = self._deadline + self._period
+        step = self._period / 20.0
+        while not self._ready():
+            if self._clock() + step >= timeout:
+                self.not_ready += 1
+                if self._stats is not None:
+                    self._stats.count('not_ready')
+                return
+            self._sleep(step)
+
+    def wait(self):
+        # block until the next deadline and return it, deadlines are on a
+        # fixed grid so the rate never drifts
+        now = self._clock()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self._period
+            late = now - self._deadline
+            if late >= self._period:
+                # whole periods went by, skip them rather than catching up
+                # with a burst of back to back samples
+                n = int(late / self._period)
+                self.missed += n
+                self._deadline += n * self._period
+                if self._stats is not None:
+                    self._stats.count('missed', n)
+            elif late < 0:
+                self.__sleep_until(self._deadline)
+
+        if self._ready is not None:
+            self.__poll_ready()
+
+        self.ticks += 1
+        jitter = self._clock() - self._deadline
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+        if self._stats is not None:
+            self._stats.jitter.add(jitter)
+
+        return self._deadline
+
+    def reset(self):
+        self._deadline = None
+        self.ticks = 0
+        self.missed = 0
+        self.not_ready = 0
+        self.max_jitter = 0.0
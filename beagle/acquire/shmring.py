@@ -0,0 +1,162 @@
+from multiprocessing import shared_memory
+import time
+import numpy as np
+
+__all__ = ['SharedRing']
+
+# head, tail, overruns, closed, errors as u32 counters in front of the
+# records, head and tail wrap around and only their difference is used
+HEADER_WORDS = 5
+HEADER_BYTES = 64
+MASK = 0xFFFFFFFF
+
+
+class SharedRing(object):
+
+    # RingBuffer across processes: one producer and one consumer process
+    # share the records through multiprocessing.shared_memory. The counters
+    # are only touched under lock, a multiprocessing.Lock handed to every
+    # process at start, which also orders the record writes before the head
+    # moves. Waiting for data polls, so no process ever blocks another.
+    #
+    # Attaching also registers the memory with the multiprocessing resource
+    # tracker, so every process has to share the creator's tracker, started
+    # before the others are, as Pipeline does.
+
+    def __init__(self, capacity, dtype, lock, name=None, poll=0.001):
+        # a power of two, so slot numbers stay continuous when the u32
+        # counters wrap
+        if capacity <= 0 or capacity & (capacity - 1) or capacity >= 1 << 31:
+            raise ValueError('capacity must be a power of two below 2^31')
+        self._dtype = np.dtype(dtype)
+        self._capacity = capacity
+        self._lock = lock
+        self._poll = poll
+        self._owner = name is None
+
+        size = HEADER_BYTES + capacity * self._dtype.itemsize
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._hdr = np.ndarray(HEADER_WORDS, dtype=np.uint32, buffer=self._shm.buf)
+        self._buf = np.ndarray(capacity, dtype=self._dtype, buffer=self._shm.buf, offset=HEADER_BYTES)
+        if self._owner:
+            self._hdr[:] = 0
+
+    def spec(self):
+        # what another process needs, along with the lock, to attach
+        return {'name': self._shm.name, 'capacity': self._capacity, 'dtype': self._dtype}
+
+    @classmethod
+    def attach(cls, spec, lock, poll=0.001):
+        return cls(spec['capacity'], spec['dtype'], lock, spec['name'], poll)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __counters(self):
+        with self._lock:
+            return int(self._hdr[0]), int(self._hdr[1])
+
+    def __len__(self):
+        head, tail = self.__counters()
+        return (head - tail) & MASK
+
+    @property
+    def overruns(self):
+        return int(self._hdr[2])
+
+    @property
+    def errors(self):
+        return int(self._hdr[4])
+
+    @property
+    def closed(self):
+        return self._hdr[3] != 0
+
+    def count_error(self):
+        with self._lock:
+            self._hdr[4] = (int(self._hdr[4]) + 1) & MASK
+
+    def close_writer(self):
+        # no more records will come, the reader drains what is left
+        with self._lock:
+            self._hdr[3] = 1
+
+    def write(self, records):
+        head, tail = self.__counters()
+        free = self._capacity - ((head - tail) & MASK)
+        n = len(records)
+        if n > free:
+            with self._lock:
+                self._hdr[2] = (int(self._hdr[2]) + n - free) & MASK
+            n = free
+        if n == 0:
+            return 0
+
+        i = head % self._capacity
+        k = min(n, self._capacity - i)
+        self._buf[i:i + k] = records[:k]
+        self._buf[:n - k] = records[k:n]
+
+        with self._lock:
+            self._hdr[0] = (head + n) & MASK
+        return n
+
+    def write_row(self, row):
+        head, tail = self.__counters()
+        if (head - tail) & MASK >= self._capacity:
+            with self._lock:
+                self._hdr[2] = (int(self._hdr[2]) + 1) & MASK
+            return 0
+
+        self._buf[head % self._capacity] = row
+        with self._lock:
+            self._hdr[0] = (head + 1) & MASK
+        return 1
+
+    def peek(self, max_rows=None, timeout=None):
+        # view of the oldest unread records up to the end of the buffer,
+        # hand them back with advance()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            head, tail = self.__counters()
+            avail = (head - tail) & MASK
+            if avail or (deadline is not None and time.monotonic() >= deadline):
+                break
+            time.sleep(self._poll)
+
+        i = tail % self._capacity
+        n = min(avail, self._capacity - i)
+        if max_rows is not None:
+            n = min(n, max_rows)
+        return self._buf[i:i + n]
+
+    def advance(self, n):
+        with self._lock:
+            head, tail = int(self._hdr[0]), int(self._hdr[1])
+            if n > (head - tail) & MASK:
+                raise ValueError('cannot advance past unread records')
+            self._hdr[1] = (tail + n) & MASK
+
+    def read(self, max_rows=None, timeout=None):
+        view = self.peek(max_rows, timeout)
+        out = view.copy()
+        self.advance(len(out))
+        return out
+
+    def release(self):
+        # views handed out by peek() must be gone by now, the process that
+        # created the ring also removes the memory
+        self._hdr = None
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
@@ -0,0 +1,152 @@
+import numpy as np
+
+__all__ = ['MotionDetector', 'WakeOnMotion', 'EventRecorder']
+
+ACCEL = ('imu_ax', 'imu_ay', 'imu_az')
+GYRO = ('imu_gx', 'imu_gy', 'imu_gz')
+
+
+class MotionDetector(object):
+
+    # host side trigger on the records, the same test the MPU's
+    # wake-on-motion logic makes: an accel axis moving by more than
+    # accel_threshold m/s^2 from one record to the next, or, given a
+    # gyro_threshold, a gyro axis turning faster than that many deg/s.
+    # Cheap enough to run on every block.
+
+    def __init__(self, accel_threshold=0.5, gyro_threshold=None, accel=ACCEL, gyro=GYRO):
+        self.accel_threshold = accel_threshold
+        self.gyro_threshold = gyro_threshold
+        self._accel = list(accel)
+        self._gyro = list(gyro)
+        self._last = None
+
+    def reset(self):
+        self._last = None
+
+    def __call__(self, records):
+        n = len(records)
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+
+        a = np.empty((n + 1, 3), dtype=np.float64)
+        for i, name in enumerate(self._accel):
+            a[1:, i] = records[name]
+        a[0] = a[1] if self._last is None else self._last
+        self._last = a[-1].copy()
+        hit = np.any(np.abs(np.diff(a, axis=0)) > self.accel_threshold, axis=1)
+
+        if self.gyro_threshold is not None:
+            for name in self._gyro:
+                hit |= np.abs(records[name]) > self.gyro_threshold
+        return hit
+
+
+class WakeOnMotion(object):
+
+    # trigger on the MPU's own wake-on-motion interrupt, set up with
+    # mpu_set_motion_interrupt(). The interrupt only says there was motion
+    # since the last block, so the last record of the block is marked and
+    # a pre-trigger window at least a block long takes in the rest. Needs
+    # the MPU, so it runs in the process that reads it.
+
+    def __init__(self, mpu):
+        self._mpu = mpu
+
+    def __call__(self, records):
+        hit = np.zeros(len(records), dtype=bool)
+        if len(records) and self._mpu.mpu_motion():
+            hit[-1] = True
+        return hit
+
+
+class EventRecorder(object):
+
+    # passes on only the records around a trigger: pre records before each
+    # triggered record and post after it, windows that touch are merged
+    # into one event. Everything else is dropped, only the last pre records
+    # are kept back in case a trigger follows. trigger is called with each
+    # block and returns a bool per record, MotionDetector or WakeOnMotion.
+    #
+    # As a Pipeline stage or in front of a log, process() returns the
+    # records to keep, in the input dtype. Events show up as gaps in the
+    # timestamps.
+
+    def __init__(self, dtype, trigger, pre=200, post=400):
+        if pre < 0 or post < 0:
+            raise ValueError('pre and post must not be negative')
+        self._dtype = np.dtype(dtype)
+        self._trigger = trigger
+        self._pre = pre
+        self._post = post
+        self.reset()
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def active(self):
+        # inside an event, records are passed on
+        return self._remaining > 0
+
+    def reset(self):
+        self._held = np.zeros(0, dtype=self._dtype)
+        self._remaining = 0
+        self._kept = False
+        # records since the last one passed on
+        self._gap = None
+        self.events = 0
+        self.triggers = 0
+        self.records = 0
+        self.written = 0
+
+    def process(self, records):
+        n = len(records)
+        hit = np.flatnonzero(self._trigger(records))
+        self.records += n
+        self.triggers += len(hit)
+
+        # mark [j - pre, j + post] around every trigger with a difference
+        # array, plus what is left of the event from the last block
+        edge = np.zeros(n + 1, dtype=np.int32)
+        np.add.at(edge, np.maximum(hit - self._pre, 0), 1)
+        np.add.at(edge, np.minimum(hit + self._post + 1, n), -1)
+        edge[0] += 1
+        edge[min(self._remaining, n)] -= 1
+        keep = np.cumsum(edge[:n]) > 0
+
+        # the pre-trigger window reaching back into the held records
+        back = 0
+        if len(hit) and hit[0] < self._pre:
+            back = min(self._pre - hit[0], len(self._held))
+        out = [self._held[len(self._held) - back:]] if back else []
+        out.append(records[keep])
+
+        # an event starts at every record kept after one that was not,
+        # unless the pre-trigger window closed the gap to the last event
+        if n:
+            merged = self._kept or (back > 0 and back == self._gap)
+            self.events += int(np.count_nonzero(keep[1:] & ~keep[:-1])) + int(keep[0] and not merged)
+
+        if len(hit):
+            self._remaining = max(self._remaining - n, hit[-1] + self._post + 1 - n, 0)
+        else:
+            self._remaining = max(self._remaining - n, 0)
+
+        # the records since the last kept one may open the next event
+        if n:
+            self._kept = bool(keep[-1])
+            last = np.flatnonzero(keep)
+            if len(last):
+                tail = records[last[-1] + 1:]
+                self._gap = len(tail)
+            else:
+                tail = np.concatenate([self._held, records]) if len(self._held) else records
+                if self._gap is not None:
+                    self._gap += n
+            self._held = tail[len(tail) - min(self._pre, len(tail)):].copy()
+
+        out = np.concatenate(out) if len(out) > 1 else out[0]
+        self.written += len(out)
+        return out
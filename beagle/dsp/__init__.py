@@ -0,0 +1,6 @@
+from ..lazy import *
+
+__getattr__, __dir__, __all__ = lazy_loader(__name__, globals(), {
+    '.ahrs': ['Madgwick', 'Mahony', 'quat_to_euler'],
+    '.decimate': ['Decimator', 'fir_lowpass', 'butter_sos'],
+})
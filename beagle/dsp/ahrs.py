@@ -0,0 +1,288 @@
+from math import sqrt
+import numpy as np
+
+__all__ = ['Madgwick', 'Mahony', 'quat_to_euler']
+
+
+def quat_to_euler(q):
+    # roll, pitch, yaw in degrees for one quaternion or an (N, 4) array
+    q = np.asarray(q, dtype=np.float64)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    roll = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return np.degrees(np.stack([roll, pitch, yaw], axis=-1))
+
+
+class _Orientation(object):
+
+    # batches come straight from the MPU decoder: gyro in deg/s, accel and
+    # mag in any unit since only their directions are used. The per sample
+    # work runs on plain floats, which is much cheaper than numpy calls on
+    # length 3 arrays
+
+    def __init__(self, sample_rate, q=None):
+        self._dt = 1.0 / sample_rate
+        self.reset(q)
+
+    def reset(self, q=None):
+        self._q = tuple(float(v) for v in q) if q is not None else (1.0, 0.0, 0.0, 0.0)
+
+    @property
+    def quaternion(self):
+        return np.array(self._q)
+
+    def euler(self):
+        return quat_to_euler(self._q)
+
+    def update(self, gyro, accel, mag=None, dt=None):
+        # one row per sample, returns the (N, 4) quaternions after each one
+        gyro = np.radians(np.atleast_2d(gyro)).tolist()
+        accel = np.atleast_2d(accel).tolist()
+        if mag is None:
+            mag = [None] * len(gyro)
+        else:
+            mag = np.atleast_2d(mag).tolist()
+
+        out = self._run(gyro, accel, mag, dt or self._dt)
+        return np.array(out).reshape(-1, 4)
+
+    def process(self, batch, euler=False):
+        # a batch from mpu_read_fifo()/mpu_decode_motion() or a single
+        # sample from mpu_read_motion(), magnetometer samples are used when
+        # there are any
+        if 'gyro' not in batch:
+            mag = [batch['mx'], batch['my'], batch['mz']] if 'mx' in batch else None
+            batch = {'gyro': [batch['gx'], batch['gy'], batch['gz']],
+                     'accel': [batch['ax'], batch['ay'], batch['az']], 'mag': mag}
+        q = self.update(batch['gyro'], batch['accel'], batch.get('mag'))
+        return quat_to_euler(q) if euler else q
+
+
+class Madgwick(_Orientation):
+
+    def __init__(self, sample_rate, beta=0.1, q=None):
+        _Orientation.__init__(self, sample_rate, q)
+        self.beta = beta
+
+    def _run(self, gyro, accel, mag, dt):
+        beta = self.beta
+        q0, q1, q2, q3 = self._q
+        out = []
+
+        for (gx, gy, gz), (ax, ay, az), m in zip(gyro, accel, mag):
+            qd0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+            qd1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+            qd2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+            qd3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+            n = ax * ax + ay * ay + az * az
+            if n > 0.0:
+                n = 1.0 / sqrt(n)
+                ax *= n
+                ay *= n
+                az *= n
+
+                mn = 0.0
+                if m is not None:
+                    mx, my, mz = m
+                    mn = mx * mx + my * my + mz * mz
+
+                if mn > 0.0:
+                    mn = 1.0 / sqrt(mn)
+                    mx *= mn
+                    my *= mn
+                    mz *= mn
+
+                    _2q0mx = 2.0 * q0 * mx
+                    _2q0my = 2.0 * q0 * my
+                    _2q0mz = 2.0 * q0 * mz
+                    _2q1mx = 2.0 * q1 * mx
+                    _2q0 = 2.0 * q0
+                    _2q1 = 2.0 * q1
+                    _2q2 = 2.0 * q2
+                    _2q3 = 2.0 * q3
+                    _2q0q2 = 2.0 * q0 * q2
+                    _2q2q3 = 2.0 * q2 * q3
+                    q0q0 = q0 * q0
+                    q0q1 = q0 * q1
+                    q0q2 = q0 * q2
+                    q0q3 = q0 * q3
+                    q1q1 = q1 * q1
+                    q1q2 = q1 * q2
+                    q1q3 = q1 * q3
+                    q2q2 = q2 * q2
+                    q2q3 = q2 * q3
+                    q3q3 = q3 * q3
+
+                    # earth frame direction of the magnetic field
+                    hx = mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + \
+                        _2q1 * mz * q3 - mx * q2q2 - mx * q3q3
+                    hy = _2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + \
+                        my * q2q2 + _2q2 * mz * q3 - my * q3q3
+                    _2bx = sqrt(hx * hx + hy * hy)
+                    _2bz = -_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + \
+                        _2q2 * my * q3 - mz * q2q2 + mz * q3q3
+                    _4bx = 2.0 * _2bx
+                    _4bz = 2.0 * _2bz
+
+                    fa0 = 2.0 * q1q3 - _2q0q2 - ax
+                    fa1 = 2.0 * q0q1 + _2q2q3 - ay
+                    fa2 = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - az
+                    fm0 = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+                    fm1 = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+                    fm2 = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+                    s0 = -_2q2 * fa0 + _2q1 * fa1 - _2bz * q2 * fm0 + \
+                        (-_2bx * q3 + _2bz * q1) * fm1 + _2bx * q2 * fm2
+                    s1 = _2q3 * fa0 + _2q0 * fa1 - 4.0 * q1 * fa2 + _2bz * q3 * fm0 + \
+                        (_2bx * q2 + _2bz * q0) * fm1 + (_2bx * q3 - _4bz * q1) * fm2
+                    s2 = -_2q0 * fa0 + _2q3 * fa1 - 4.0 * q2 * fa2 + (-_4bx * q2 - _2bz * q0) * fm0 + \
+                        (_2bx * q1 + _2bz * q3) * fm1 + (_2bx * q0 - _4bz * q2) * fm2
+                    s3 = _2q1 * fa0 + _2q2 * fa1 + (-_4bx * q3 + _2bz * q1) * fm0 + \
+                        (-_2bx * q0 + _2bz * q2) * fm1 + _2bx * q1 * fm2
+                else:
+                    _2q0 = 2.0 * q0
+                    _2q1 = 2.0 * q1
+                    _2q2 = 2.0 * q2
+                    _2q3 = 2.0 * q3
+                    _4q0 = 4.0 * q0
+                    _4q1 = 4.0 * q1
+                    _4q2 = 4.0 * q2
+                    _8q1 = 8.0 * q1
+                    _8q2 = 8.0 * q2
+                    q0q0 = q0 * q0
+                    q1q1 = q1 * q1
+                    q2q2 = q2 * q2
+                    q3q3 = q3 * q3
+
+                    s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+                    s1 = _4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + \
+                        _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az
+                    s2 = 4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + \
+                        _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az
+                    s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+
+                n = s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3
+                if n > 0.0:
+                    n = beta / sqrt(n)
+                    qd0 -= n * s0
+                    qd1 -= n * s1
+                    qd2 -= n * s2
+                    qd3 -= n * s3
+
+            q0 += qd0 * dt
+            q1 += qd1 * dt
+            q2 += qd2 * dt
+            q3 += qd3 * dt
+            n = 1.0 / sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0 *= n
+            q1 *= n
+            q2 *= n
+            q3 *= n
+            out += (q0, q1, q2, q3)
+
+        self._q = (q0, q1, q2, q3)
+        return out
+
+
+class Mahony(_Orientation):
+
+    def __init__(self, sample_rate, kp=1.0, ki=0.0, q=None):
+        _Orientation.__init__(self, sample_rate, q)
+        self.kp = kp
+        self.ki = ki
+
+    def reset(self, q=None):
+        _Orientation.reset(self, q)
+        self._integral = (0.0, 0.0, 0.0)
+
+    def _run(self, gyro, accel, mag, dt):
+        kp2 = 2.0 * self.kp
+        ki2 = 2.0 * self.ki * dt
+        ix, iy, iz = self._integral
+        q0, q1, q2, q3 = self._q
+        half_dt = 0.5 * dt
+        out = []
+
+        for (gx, gy, gz), (ax, ay, az), m in zip(gyro, accel, mag):
+            n = ax * ax + ay * ay + az * az
+            if n > 0.0:
+                n = 1.0 / sqrt(n)
+                ax *= n
+                ay *= n
+                az *= n
+
+                q0q0 = q0 * q0
+                q0q1 = q0 * q1
+                q0q2 = q0 * q2
+                q1q3 = q1 * q3
+                q2q3 = q2 * q3
+                q3q3 = q3 * q3
+
+                # estimated direction of gravity, and the error to the
+                # measured one
+                vx = q1q3 - q0q2
+                vy = q0q1 + q2q3
+                vz = q0q0 - 0.5 + q3q3
+                ex = ay * vz - az * vy
+                ey = az * vx - ax * vz
+                ez = ax * vy - ay * vx
+
+                mn = 0.0
+                if m is not None:
+                    mx, my, mz = m
+                    mn = mx * mx + my * my + mz * mz
+
+                if mn > 0.0:
+                    mn = 1.0 / sqrt(mn)
+                    mx *= mn
+                    my *= mn
+                    mz *= mn
+
+                    q0q3 = q0 * q3
+                    q1q1 = q1 * q1
+                    q1q2 = q1 * q2
+                    q2q2 = q2 * q2
+
+                    hx = 2.0 * (mx * (0.5 - q2q2 - q3q3) + my * (q1q2 - q0q3) + mz * (q1q3 + q0q2))
+                    hy = 2.0 * (mx * (q1q2 + q0q3) + my * (0.5 - q1q1 - q3q3) + mz * (q2q3 - q0q1))
+                    bx = sqrt(hx * hx + hy * hy)
+                    bz = 2.0 * (mx * (q1q3 - q0q2) + my * (q2q3 + q0q1) + mz * (0.5 - q1q1 - q2q2))
+
+                    wx = bx * (0.5 - q2q2 - q3q3) + bz * (q1q3 - q0q2)
+                    wy = bx * (q1q2 - q0q3) + bz * (q0q1 + q2q3)
+                    wz = bx * (q0q2 + q1q3) + bz * (0.5 - q1q1 - q2q2)
+                    ex += my * wz - mz * wy
+                    ey += mz * wx - mx * wz
+                    ez += mx * wy - my * wx
+
+                if ki2 > 0.0:
+                    ix += ki2 * ex
+                    iy += ki2 * ey
+                    iz += ki2 * ez
+                    gx += ix
+                    gy += iy
+                    gz += iz
+
+                gx += kp2 * ex
+                gy += kp2 * ey
+                gz += kp2 * ez
+
+            gx *= half_dt
+            gy *= half_dt
+            gz *= half_dt
+            q0, q1, q2, q3 = (q0 - q1 * gx - q2 * gy - q3 * gz,
+                              q1 + q0 * gx + q2 * gz - q3 * gy,
+                              q2 + q0 * gy - q1 * gz + q3 * gx,
+                              q3 + q0 * gz + q1 * gy - q2 * gx)
+            n = 1.0 / sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0 *= n
+            q1 *= n
+            q2 *= n
+            q3 *= n
+            out += (q0, q1, q2, q3)
+
+        self._integral = (ix, iy, iz)
+        self._q = (q0, q1, q2, q3)
+        return out
@@ -0,0 +1,145 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+__all__ = ['Decimator', 'fir_lowpass', 'butter_sos']
+
+
+def fir_lowpass(ntaps, cutoff):
+    # Hamming windowed sinc, cutoff in cycles per input sample, unity gain
+    n = np.arange(ntaps) - (ntaps - 1) / 2.0
+    taps = 2.0 * cutoff * np.sinc(2.0 * cutoff * n) * np.hamming(ntaps)
+    return taps / taps.sum()
+
+
+def butter_sos(order, cutoff):
+    # Butterworth low pass as second order sections (b0, b1, b2, a1, a2)
+    # through the prewarped bilinear transform, cutoff in cycles per sample
+    k = np.tan(np.pi * cutoff)
+    sos = []
+    for i in range(order // 2):
+        q = 1.0 / (2.0 * np.sin(np.pi * (2 * i + 1) / (2.0 * order)))
+        norm = 1.0 / (1.0 + k / q + k * k)
+        b0 = k * k * norm
+        sos.append((b0, 2.0 * b0, b0, 2.0 * (k * k - 1.0) * norm, (1.0 - k / q + k * k) * norm))
+    if order % 2:
+        b0 = k / (k + 1.0)
+        sos.append((b0, b0, 0.0, (k - 1.0) / (k + 1.0), 0.0))
+    return sos
+
+
+class Decimator(object):
+
+    # low pass and keep every factor-th record of a structured record
+    # stream, block by block with the filter state carried across blocks,
+    # so it can sit between an Acquisition ring and a log writer. Float
+    # channels are filtered, the timestamp is taken from the output sample
+    # (moved back by the FIR group delay) and integer channels such as the
+    # mag_new/baro_new flags are ORed over the samples that were dropped.
+    #
+    # The FIR path only computes the outputs that are kept. The IIR path
+    # filters every input sample but needs far fewer taps for the same
+    # stop band.
+
+    def __init__(self, dtype, factor, kind='fir', cutoff=None, ntaps=None, order=4):
+        if factor < 1:
+            raise ValueError('decimation factor must be at least 1')
+        if kind not in ('fir', 'iir'):
+            raise ValueError('filter kind must be fir or iir')
+
+        self.dtype = np.dtype(dtype)
+        self.factor = factor
+        self.kind = kind
+
+        # 80 % of the output Nyquist frequency by default
+        cutoff = cutoff or 0.4 / factor
+        self._float = [n for n in self.dtype.names
+                       if n != 'timestamp' and self.dtype[n].kind == 'f']
+        self._flags = [n for n in self.dtype.names if self.dtype[n].kind in 'biu']
+
+        if kind == 'fir':
+            ntaps = ntaps or 8 * factor + 1
+            self._taps = fir_lowpass(ntaps, cutoff)[::-1].copy()
+            self._delay = (ntaps - 1) // 2
+        else:
+            ntaps = 1
+            self._sos = butter_sos(order, cutoff)
+            self._delay = 0
+        self._hist_len = max(ntaps, factor) - 1
+        self.reset()
+
+    def reset(self):
+        self._hist = None
+        self._next = 0
+        if self.kind == 'iir':
+            self._zi = None
+
+    def __iir(self, x):
+        # direct form II transposed, one section after the other. The loop
+        # over samples runs on plain floats, one channel at a time, which is
+        # a lot cheaper than numpy calls on a handful of values
+        if self._zi is None:
+            # start from the steady state of the first sample
+            self._zi = [[((b1 - a1) * v + (b2 - a2) * v, (b2 - a2) * v)
+                         for b0, b1, b2, a1, a2 in self._sos] for v in x[0].tolist()]
+
+        y = []
+        for c, col in enumerate(x.T.tolist()):
+            zi = self._zi[c]
+            for s, (b0, b1, b2, a1, a2) in enumerate(self._sos):
+                z1, z2 = zi[s]
+                out = []
+                for xi in col:
+                    yi = b0 * xi + z1
+                    z1 = b1 * xi - a1 * yi + z2
+                    z2 = b2 * xi - a2 * yi
+                    out.append(yi)
+                zi[s] = (z1, z2)
+                col = out
+            y.append(col)
+        return np.array(y).T.reshape(x.shape)
+
+    def process(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        n = len(records)
+        out = np.zeros(0, dtype=self.dtype)
+        if n == 0:
+            return out
+
+        x = np.stack([records[c].astype(np.float64) for c in self._float], axis=1) \
+            if self._float else np.zeros((n, 0))
+        if self.kind == 'iir' and self._float:
+            x = self.__iir(x)
+
+        if self._hist is None:
+            # prime the history with the first record to avoid a step, the
+            # first output is centred on the first record, not on the copies
+            self._hist = (np.repeat(x[:1], self._hist_len, axis=0),
+                          np.repeat(records[:1], self._hist_len))
+            self._next = self._hist_len + self._delay
+        buf = np.concatenate([self._hist[0], x])
+        rec = np.concatenate([self._hist[1], records])
+
+        # buffer positions of the outputs that are complete
+        pos = np.arange(self._next, len(buf), self.factor)
+        self._next = (pos[-1] + self.factor if len(pos) else self._next) - (len(buf) - self._hist_len)
+        self._hist = (buf[len(buf) - self._hist_len:], rec[len(rec) - self._hist_len:])
+        if len(pos) == 0:
+            return out
+
+        out = np.empty(len(pos), dtype=self.dtype)
+        if self.kind == 'fir':
+            ntaps = len(self._taps)
+            win = sliding_window_view(buf, ntaps, axis=0)[pos - ntaps + 1]
+            y = win.dot(self._taps)
+        else:
+            y = buf[pos]
+        for i, c in enumerate(self._float):
+            out[c] = y[:, i]
+
+        if 'timestamp' in self.dtype.names:
+            out['timestamp'] = rec['timestamp'][pos - self._delay]
+        for c in self._flags:
+            win = sliding_window_view(rec[c], self.factor)[pos - self.factor + 1]
+            out[c] = win.max(axis=1)
+
+        return out
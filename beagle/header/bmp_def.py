@@ -64,6 +64,12 @@ BMP280_RESET_WORD = 0xB6
 BMP280_CHIP_ID_REG = 0xD0
 BMP280_CHIP_ID = 0x58
 
+# bring-up timing in seconds: bounds for the NVM copy after a reset and for
+# the first conversion, whose registers read 0x80000 until it completes
+BMP280_NVM_TIMEOUT = 0.05
+BMP280_RESET_ADC = 0x80000
+BMP280_MEAS_TIMEOUT = 0.2
+
 # calibration constant registers
 BMP280_DIG_T1 = 0x88
 BMP280_DIG_T2 = 0x8A
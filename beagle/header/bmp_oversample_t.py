@@ -12,3 +12,12 @@ BMP_OVERSAMPLE_8 = 0x04 << 2
 
 # update rate 28 HZ
 BMP_OVERSAMPLE_16 = 0x05 << 2
+
+# update rate in Hz of each oversample setting
+BMP_OVERSAMPLE_RATE = {
+    BMP_OVERSAMPLE_1: 182,
+    BMP_OVERSAMPLE_2: 133,
+    BMP_OVERSAMPLE_4: 87,
+    BMP_OVERSAMPLE_8: 51,
+    BMP_OVERSAMPLE_16: 28,
+}
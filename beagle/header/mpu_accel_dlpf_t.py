@@ -6,3 +6,5 @@ ACCEL_DLPF_41 = 4
 ACCEL_DLPF_20 = 5
 ACCEL_DLPF_10 = 6
 ACCEL_DLPF_5 = 7
+
+ACCEL_DLPFS = tuple(range(ACCEL_DLPF_OFF, ACCEL_DLPF_5 + 1))
@@ -2,3 +2,5 @@ ACCEL_FSR_2G = 0
 ACCEL_FSR_4G = 1
 ACCEL_FSR_8G = 2
 ACCEL_FSR_16G = 3
+
+ACCEL_FSRS = (ACCEL_FSR_2G, ACCEL_FSR_4G, ACCEL_FSR_8G, ACCEL_FSR_16G)
@@ -11,7 +11,16 @@ CONFIG = 0x1A
 GYRO_CONFIG = 0x1B
 ACCEL_CONFIG = 0x1C
 ACCEL_CONFIG_2 = 0x1D
+WOM_THR = 0x1F
+FIFO_EN = 0x23
+I2C_MST_CTRL = 0x24
+I2C_SLV0_ADDR = 0x25
+I2C_SLV0_REG = 0x26
+I2C_SLV0_CTRL = 0x27
+I2C_MST_STATUS = 0x36
 INT_PIN_CFG = 0x37
+INT_ENABLE = 0x38
+INT_STATUS = 0x3A
 ACCEL_XOUT_H = 0x3B
 ACCEL_XOUT_L = 0x3C
 ACCEL_YOUT_H = 0x3D
@@ -26,9 +35,17 @@ GYRO_YOUT_H = 0x45
 GYRO_YOUT_L = 0x46
 GYRO_ZOUT_H = 0x47
 GYRO_ZOUT_L = 0x48
+EXT_SENS_DATA_00 = 0x49
+I2C_SLV0_DO = 0x63
+I2C_MST_DELAY_CTRL = 0x67
+ACCEL_INTEL_CTRL = 0x69
 USER_CTRL = 0x6A
 PWR_MGMT_1 = 0x6B
 PWR_MGMT_2 = 0x6C
+FIFO_COUNTH = 0x72
+FIFO_COUNTL = 0x73
+FIFO_R_W = 0x74
+WHO_AM_I = 0x75
 WHO_AM_I_MPU9250 = 0x71
 
 
@@ -56,6 +73,52 @@ ACCEL_FSR_CFG_16G = 0x03 << 3
 ACCEL_FCHOICE_1KHZ = 0x00 << 3
 ACCEL_FCHOICE_4KHZ = 0x01 << 3
 
+"""
+FIFO_EN register bits
+"""
+FIFO_TEMP_OUT = 0x01 << 7
+FIFO_GYRO_XOUT = 0x01 << 6
+FIFO_GYRO_YOUT = 0x01 << 5
+FIFO_GYRO_ZOUT = 0x01 << 4
+FIFO_ACCEL = 0x01 << 3
+FIFO_SLV2 = 0x01 << 2
+FIFO_SLV1 = 0x01 << 1
+FIFO_SLV0 = 0x01
+
+"""
+FIFO geometry
+FIFO_COUNTH only holds the upper 5 bits of the byte count, a single smbus
+block transfer is limited to 32 bytes
+"""
+FIFO_SIZE = 1024
+FIFO_COUNTH_MASK = 0x1F
+I2C_BLOCK_MAX = 32
+
+"""
+I2C master register bits
+"""
+WAIT_FOR_ES = 0x01 << 6
+I2C_MST_P_NSR = 0x01 << 4
+I2C_MST_CLK_400 = 0x0D
+I2C_READ_FLAG = 0x01 << 7
+I2C_SLV_EN = 0x01 << 7
+
+"""
+ACCEL_INTEL_CTRL register bits, wake-on-motion compares every sample with
+the one before, the threshold is in WOM_THR_MG steps
+"""
+ACCEL_INTEL_EN = 0x01 << 7
+ACCEL_INTEL_MODE = 0x01 << 6
+WOM_THR_MG = 4.0
+
+"""
+INT_STATUS register bits
+"""
+WOM_INT = 0x01 << 6
+FIFO_OFLOW_INT = 0x01 << 4
+FSYNC_INT = 0x01 << 3
+RAW_DATA_RDY_INT = 0x01
+
 """
 INT_PIN_CFG
 """
@@ -97,6 +160,11 @@ temperature reading constants
 ROOM_TEMP_OFFSET = 0x00
 TEMP_SENSITIVITY = 333.87
 
+"""
+standard gravity in m/s^2
+"""
+GRAVITY = 9.80665
+
 
 """
 USER_CTRL settings bits
@@ -142,6 +210,10 @@ MAG_FUSE_ROM = 0x0F
 MSCALE_16 = 0x01 << 4
 MSCALE_14 = 0x00
 
+# output data rate of the continuous measurement modes in Hz
+MAG_CONT_MES_1_RATE = 8
+MAG_CONT_MES_2_RATE = 100
+
 """
 Magnetometer AK8963_ST2 register definitions
 """
@@ -152,6 +224,15 @@ Magnetometer AK8963_ST1 register definitions
 """
 MAG_DATA_READY = 0x01
 
+"""
+Bring-up timing in seconds: bounds for status polling, the AK8963 needs
+100 us after a power down before it takes the next mode
+"""
+MPU_RESET_TIMEOUT = 0.2
+MPU_DATA_TIMEOUT = 0.3
+MAG_BYPASS_TIMEOUT = 0.05
+MAG_MODE_SETTLE = 0.0001
+
 """
 Magnetometer sensitivity in micro Teslas to LSB
 """
@@ -6,3 +6,5 @@ GYRO_DLPF_41 = 4
 GYRO_DLPF_20 = 5
 GYRO_DLPF_10 = 6
 GYRO_DLPF_5 = 7
+
+GYRO_DLPFS = tuple(range(GYRO_DLPF_OFF, GYRO_DLPF_5 + 1))
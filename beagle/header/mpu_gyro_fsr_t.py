@@ -2,3 +2,5 @@ GYRO_FSR_250DPS = 0
 GYRO_FSR_500DPS = 1
 GYRO_FSR_1000DPS = 2
 GYRO_FSR_2000DPS = 3
+
+GYRO_FSRS = (GYRO_FSR_250DPS, GYRO_FSR_500DPS, GYRO_FSR_1000DPS, GYRO_FSR_2000DPS)
@@ -0,0 +1,29 @@
+import importlib
+
+__all__ = ['lazy_loader']
+
+
+def lazy_loader(package, namespace, modules, submodules=()):
+    # module level __getattr__ and __dir__ for a package whose public names
+    # live in heavy submodules. modules maps a relative module name to the
+    # names it exports, the module is imported the first time one of them
+    # is looked up. Returns the pair and the sorted public names.
+    names = {}
+    for mod, attrs in modules.items():
+        for attr in attrs:
+            names[attr] = mod
+
+    def __getattr__(name):
+        if name in names:
+            value = getattr(importlib.import_module(names[name], package), name)
+        elif name in submodules:
+            value = importlib.import_module('.' + name, package)
+        else:
+            raise AttributeError('module %r has no attribute %r' % (package, name))
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(names) | set(submodules))
+
+    return __getattr__, __dir__, sorted(names)
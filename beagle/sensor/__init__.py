@@ -1,2 +1,15 @@
-from .mpu9250 import *
-from .bmp280 import *
+from ..lazy import *
+
+# nothing, in particular numpy, is imported until it is used
+__getattr__, __dir__, __all__ = lazy_loader(__name__, globals(), {
+    '.mpu9250': ['MPU'],
+    '.bmp280': ['BMP'],
+    '.decode': ['ACCEL_FRAME', 'GYRO_FRAME', 'TEMP_FRAME', 'MOTION_FRAME', 'FIFO_FRAME', 'MAG_FRAME',
+                'MOTION_MAG_FRAME', 'FIFO_MAG_FRAME', 'BMP_FRAME', 'decode_accel', 'decode_gyro', 'decode_temp', 'decode_mag', 'decode_motion',
+                'decode_fifo', 'decode_bmp_adc'],
+    '.bus': ['open_bus'],
+    '.cache': ['CalibrationCache', 'chip_key'],
+    '.calibration': ['Calibration', 'Calibrator', 'EllipsoidFit'],
+    '.bringup': ['open_sensors'],
+    '.stats': ['Histogram', 'SensorStats', 'InstrumentedBus'],
+})
@@ -1,39 +1,50 @@
 from ..header import *
-import smbus
-import time
+from .bus import *
+from .stats import *
+from ..tools import *
+import struct
 import numpy as np
 
 __all__ = ['BMP']
 
+BMP280_CAL_KEYS = ('dig_T1', 'dig_T2', 'dig_T3', 'dig_P1', 'dig_P2', 'dig_P3',
+                   'dig_P4', 'dig_P5', 'dig_P6', 'dig_P7', 'dig_P8', 'dig_P9')
+
 
 class BMP(object):
 
-    def __init__(self, bus=BMP_BUS, addr=BMP280_ADDR, oversample_=BMP_OVERSAMPLE_16, filter_=BMP_FILTER_OFF):
-        self._bus = smbus.SMBus(bus)
+    def __init__(self, bus=BMP_BUS, addr=BMP280_ADDR, oversample_=BMP_OVERSAMPLE_16, filter_=BMP_FILTER_OFF,
+                 stats=None, retries=0):
+        self._bus = open_bus(bus)
+        # failed transactions are retried retries times, counted in stats
+        if stats is not None or retries:
+            self._bus = InstrumentedBus(self._bus, stats if stats is not None else SensorStats(), retries)
+        self._bus_id = bus
         self._addr = addr
+        self._sample_rate = BMP_OVERSAMPLE_RATE.get(oversample_, BMP_OVERSAMPLE_RATE[BMP_OVERSAMPLE_16])
 
-        self._bmp280_cal = {
-            'dig_T1': np.uint16(),
-            'dig_T2': np.int16(),
-            'dig_T3': np.int16(),
-            'dig_P1': np.uint16(),
-            'dig_P2': np.int16(),
-            'dig_P3': np.int16(),
-            'dig_P4': np.int16(),
-            'dig_P5': np.int16(),
-            'dig_P6': np.int16(),
-            'dig_P7': np.int16(),
-            'dig_P8': np.int16(),
-            'dig_P9': np.int16(),
-            'sea_level_pa': np.float64(),
-        }
+        self._bmp280_cal = dict.fromkeys(BMP280_CAL_KEYS, 0)
+        self._bmp280_cal['sea_level_pa'] = float(DEFAULT_SEA_LEVEL_PA)
+        self.__precompute()
 
         self.__bmp_init(oversample_, filter_)
 
+    def __nvm_ready(self):
+        return (self._bus.read_byte_data(self._addr, BMP280_STATUS_REG) & BMP280_IM_UPDATE_STATUS) == 0
+
+    def __measured(self):
+        raw = self._bus.read_i2c_block_data(self._addr, BMP280_PRESSURE_MSB, 3)
+        return ((raw[0] << 12) | (raw[1] << 4) | (raw[2] >> 4)) != BMP280_RESET_ADC
+
     def __bmp_init(self, oversample_, filter_):
         # reset the barometer
         self._bus.write_byte_data(self._addr, BMP280_RESET_REG, BMP280_RESET_WORD)
 
+        # keep checking the status register until the NVM calibration has
+        # been copied after the reset
+        if not poll_until(self.__nvm_ready, BMP280_NVM_TIMEOUT):
+            return -1
+
         # check the chip ID register
         c = self._bus.read_byte_data(self._addr, BMP280_CHIP_ID_REG)
         if c != BMP280_CHIP_ID:
@@ -53,78 +64,136 @@ class BMP(object):
         c |= filter_
         self._bus.write_byte_data(self._addr, BMP280_CONFIG, c)
 
-        # keep checking the status register until the NVM calibration is ready
-        # after a short wait
-        i = 0
-        loop_cond = True
-        while loop_cond:
-            time.sleep(0.2)
-            c = self._bus.read_byte_data(self._addr, BMP280_STATUS_REG)
-            if i > 10:
-                return -1
-            i += 1
-            if (c & BMP280_IM_UPDATE_STATUS) == 0:
-                loop_cond = False
-
         # retrieve the factory NVM calibration data all in one go
         buf = self._bus.read_i2c_block_data(self._addr, BMP280_DIG_T1, 24)
 
-        # save calibration in useful format
-        self._bmp280_cal['dig_T1'] = np.uint16((buf[1] << 8) | buf[0])
-        self._bmp280_cal['dig_T2'] = np.uint16((buf[3] << 8) | buf[2])
-        self._bmp280_cal['dig_T3'] = np.uint16((buf[5] << 8) | buf[4])
-        self._bmp280_cal['dig_P1'] = np.uint16((buf[7] << 8) | buf[6])
-        self._bmp280_cal['dig_P2'] = np.uint16((buf[9] << 8) | buf[8])
-        self._bmp280_cal['dig_P3'] = np.uint16((buf[11] << 8) | buf[10])
-        self._bmp280_cal['dig_P4'] = np.uint16((buf[13] << 8) | buf[12])
-        self._bmp280_cal['dig_P5'] = np.uint16((buf[15] << 8) | buf[14])
-        self._bmp280_cal['dig_P6'] = np.uint16((buf[17] << 8) | buf[16])
-        self._bmp280_cal['dig_P7'] = np.uint16((buf[19] << 8) | buf[18])
-        self._bmp280_cal['dig_P8'] = np.uint16((buf[21] << 8) | buf[20])
-        self._bmp280_cal['dig_P9'] = np.uint16((buf[23] << 8) | buf[22])
+        # save calibration as plain ints, T1 and P1 are unsigned, the rest signed
+        self._bmp280_cal.update(zip(BMP280_CAL_KEYS, struct.unpack('<HhhHhhhhhhhh', bytes(buf))))
 
         # use default pressure for now unless user sets it otherwise
-        self._bmp280_cal['sea_level_pa'] = DEFAULT_SEA_LEVEL_PA
+        self._bmp280_cal['sea_level_pa'] = float(DEFAULT_SEA_LEVEL_PA)
+        self.__precompute()
+
+        # wait for the first conversion
+        if not poll_until(self.__measured, BMP280_MEAS_TIMEOUT):
+            return -1
+
+        return 0
+
+    def bmp_sample_rate(self):
+        return self._sample_rate
 
-        time.sleep(0.5)
+    def __precompute(self):
+        self._comp = _constants(self._bmp280_cal)
+        self._inv_sea_level_pa = 1.0 / self._bmp280_cal['sea_level_pa']
+
+    def bmp_calibration(self):
+        # the NVM calibration and sea level pressure, to compensate raw
+        # readings elsewhere
+        return dict(self._bmp280_cal)
+
+    def bmp_set_sea_level_pa(self, pa):
+        self._bmp280_cal['sea_level_pa'] = float(pa)
+        self.__precompute()
+
+    def bmp_read_raw(self):
+        # the undecoded BMP280_PRESSURE_MSB..BMP280_TEMPERATURE_XLSB window, BMP_FRAME
+        return bytes(self._bus.read_i2c_block_data(self._addr, BMP280_PRESSURE_MSB, 6))
 
     def bmp_read(self):
-        raw = self._bus.read_i2c_block_data(self._addr, BMP280_PRESSURE_MSB, 6)
+        raw = self.bmp_read_raw()
 
-        # run the numbers, thanks to Bosch for putting this code in their datasheet
         adc_P = (raw[0] << 12) | (raw[1] << 4) | (raw[2] >> 4)
         adc_T = (raw[3] << 12) | (raw[4] << 4) | (raw[5] >> 4)
 
-        var1 = (((adc_T >> 3) - (self._bmp280_cal['dig_T1'] << 1)) *
-                self._bmp280_cal['dig_T2']) >> 11
-        var2 = (((((adc_T >> 4) - self._bmp280_cal['dig_T1']) *
-                  ((adc_T >> 4) - self._bmp280_cal['dig_T1'])) >> 12) *
-                self._bmp280_cal['dig_T3']) >> 14
-
-        t_fine = var1 + var2
-        T = (t_fine * 5 + 128) >> 8
-        temp_c = T / 100.0
-
-        var3 = np.int64(t_fine) - 128000
-        var4 = var3 * var3 * self._bmp280_cal['dig_P6']
-        var4 = var4 + ((var3 * self._bmp280_cal['dig_P5']) << 17)
-        var4 = var4 + (self._bmp280_cal['dig_P4'] << 35)
-        var3 = (var3 * var3 * self._bmp280_cal['dig_P3'] >> 8) +\
-               ((var3 * self._bmp280_cal['dig_P2']) << 12)
-        var3 = ((1 << 47) + var3) * self._bmp280_cal['dig_P1'] >> 33
+        # run the numbers, thanks to Bosch for putting this code in their datasheet
+        c = _compensate(self._comp, adc_P, adc_T)
 
         # avoid exception caused by division by zero
-        if var3 == 0:
+        if c is None:
             return -1
 
-        p = 1048576 - adc_P
-        p = (((p << 31) - var4) * 3125) / var3
-        var3 = (np.int64(self._bmp280_cal['dig_P9']) * (p >> 13) * (p >> 13)) >> 25
-        var4 = (np.int64(self._bmp280_cal['dig_P8']) * p) >> 19
+        temp_c, pressure_pa = c
+        alt_m = 44330.0 * (1.0 - pow(pressure_pa * self._inv_sea_level_pa, 0.1903))
 
-        p = ((p + var3 + var4) >> 8) + (self._bmp280_cal['dig_P7'] << 4)
-        pressure_pa = p / 256.0
+        return {'temp': temp_c, 'pressure': pressure_pa / 100.0, 'altitude': alt_m}
 
-        alt_m = 44330.0 * (1.0 - pow(pressure_pa / self._bmp280_cal['sea_level_pa'], 0.1903))
+    def bmp_compensate(self, adc_P, adc_T):
+        # bmp_read() over whole arrays of raw readings with the same integer
+        # arithmetic in int64, so the results are bit for bit identical.
+        # Samples that would divide by zero come out as nan.
+        temp_c, pressure_pa = _compensate_array(self._comp, adc_P, adc_T)
+        alt_m = 44330.0 * (1.0 - np.power(pressure_pa * self._inv_sea_level_pa, 0.1903))
 
         return {'temp': temp_c, 'pressure': pressure_pa / 100.0, 'altitude': alt_m}
+
+
+def _constants(cal):
+    # the compensation constants as plain ints with the constant shifts
+    # already applied
+    return (cal['dig_T1'], cal['dig_T1'] << 1, cal['dig_T2'], cal['dig_T3'],
+            cal['dig_P1'], cal['dig_P2'], cal['dig_P3'], cal['dig_P4'] << 35,
+            cal['dig_P5'], cal['dig_P6'], cal['dig_P7'] << 4, cal['dig_P8'], cal['dig_P9'])
+
+
+def _compensate_array(k, adc_P, adc_T):
+    # _compensate() in int64
+    T1, T1x2, T2, T3, P1, P2, P3, P4x, P5, P6, P7x, P8, P9 = k
+    adc_P = np.asarray(adc_P, dtype=np.int64)
+    adc_T = np.asarray(adc_T, dtype=np.int64)
+
+    var1 = (((adc_T >> 3) - T1x2) * T2) >> 11
+    var2 = (((((adc_T >> 4) - T1) * ((adc_T >> 4) - T1)) >> 12) * T3) >> 14
+    t_fine = var1 + var2
+    T = (t_fine * 5 + 128) >> 8
+
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * P6 + ((var1 * P5) << 17) + P4x
+    var1 = ((var1 * var1 * P3) >> 8) + ((var1 * P2) << 12)
+    var1 = (((1 << 47) + var1) * P1) >> 33
+
+    # np.where so scalar readings work as well as arrays
+    bad = var1 == 0
+    var1 = np.where(bad, 1, var1)
+
+    p = 1048576 - adc_P
+    p = ((p << 31) - var2) * 3125
+    q = np.abs(p) // np.abs(var1)
+    p = np.where((p < 0) != (var1 < 0), -q, q)
+    var1 = (P9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (P8 * p) >> 19
+    p = ((p + var1 + var2) >> 8) + P7x
+
+    temp_c = T / 100.0
+    pressure_pa = np.where(bad, np.nan, p / 256.0)
+    return temp_c, pressure_pa
+
+
+def _compensate(k, adc_P, adc_T):
+    # Bosch's 32 bit temperature and 64 bit pressure compensation on plain
+    # python ints, which behave like the C integers as long as the division
+    # rounds toward zero
+    T1, T1x2, T2, T3, P1, P2, P3, P4x, P5, P6, P7x, P8, P9 = k
+
+    var1 = (((adc_T >> 3) - T1x2) * T2) >> 11
+    var2 = (((((adc_T >> 4) - T1) * ((adc_T >> 4) - T1)) >> 12) * T3) >> 14
+    t_fine = var1 + var2
+    T = (t_fine * 5 + 128) >> 8
+
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * P6 + ((var1 * P5) << 17) + P4x
+    var1 = ((var1 * var1 * P3) >> 8) + ((var1 * P2) << 12)
+    var1 = (((1 << 47) + var1) * P1) >> 33
+
+    if var1 == 0:
+        return None
+
+    p = 1048576 - adc_P
+    p = ((p << 31) - var2) * 3125
+    q = abs(p) // abs(var1)
+    p = -q if (p < 0) != (var1 < 0) else q
+    var1 = (P9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (P8 * p) >> 19
+    p = ((p + var1 + var2) >> 8) + P7x
+
+    return T / 100.0, p / 256.0
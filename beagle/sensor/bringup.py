@@ -0,0 +1,11 @@
+import concurrent.futures
+
+__all__ = ['open_sensors']
+
+
+def open_sensors(*specs):
+    # construct several sensors at once, each spec is (factory, kwargs).
+    # Most of a bring-up is waiting on the chips, so the waits overlap.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(specs), 1)) as pool:
+        futures = [pool.submit(factory, **kwargs) for factory, kwargs in specs]
+        return [f.result() for f in futures]
@@ -0,0 +1,12 @@
+__all__ = ['open_bus']
+
+
+def open_bus(bus):
+    # an int is the number of a Linux i2c adapter, anything else is taken to
+    # be a bus object with the smbus.SMBus methods the sensors use:
+    # read_byte_data, write_byte_data and read_i2c_block_data
+    if isinstance(bus, int):
+        import smbus
+        return smbus.SMBus(bus)
+
+    return bus
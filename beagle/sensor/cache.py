@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+
+__all__ = ['CalibrationCache', 'chip_key']
+
+DEFAULT_CACHE_PATH = os.path.join('~', '.cache', 'beagle', 'calibration.json')
+
+
+def chip_key(kind, bus, addr):
+    # a chip is identified by its type and where it sits, injected bus
+    # objects are named by their type
+    if not isinstance(bus, int):
+        bus = type(bus).__name__
+    return '%s:%s:0x%02x' % (kind, bus, addr)
+
+
+class CalibrationCache(object):
+
+    # calibration saved for a chip, kept in a small JSON file so a
+    # restarted collector applies it right away. Keys name a position on a
+    # bus, not a chip, so only what the user calibrated there is kept
+
+    def __init__(self, path=None):
+        self._path = os.path.expanduser(path or os.environ.get('BEAGLE_CACHE', DEFAULT_CACHE_PATH))
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def __load(self):
+        if self._data is None:
+            try:
+                with open(self._path) as f:
+                    self._data = json.load(f)
+            except (IOError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, key):
+        with self._lock:
+            return self.__load().get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self.__put(key, value)
+
+    def __put(self, key, value):
+        data = self.__load()
+        if data.get(key) == value:
+            return
+
+        data[key] = value
+        d = os.path.dirname(self._path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+
+        # replace the file in one step so a crash never leaves half of it
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._path)
+
+    def clear(self, key=None):
+        with self._lock:
+            self.__clear(key)
+
+    def __clear(self, key):
+        data = self.__load()
+        if key is None:
+            data.clear()
+        else:
+            data.pop(key, None)
+        if os.path.exists(self._path):
+            with open(self._path, 'w') as f:
+                json.dump(data, f)
@@ -0,0 +1,188 @@
+from ..header import *
+import numpy as np
+
+__all__ = ['Calibration', 'Calibrator', 'EllipsoidFit']
+
+
+class EllipsoidFit(object):
+
+    # least squares fit of a*x^2 + b*y^2 + c*z^2 [+ 2d*xy + 2e*xz + 2f*yz]
+    # + 2g*x + 2h*y + 2i*z = 1. Only the normal equations are accumulated,
+    # so memory stays constant however many samples are added and the fit
+    # can be solved again at any time
+
+    def __init__(self, axis_aligned=False, state=None):
+        self._aligned = axis_aligned
+        k = 6 if axis_aligned else 9
+        self._ata = np.zeros((k, k))
+        self._atb = np.zeros(k)
+        self._n = 0
+        if state is not None:
+            self._ata[:] = state['ata']
+            self._atb[:] = state['atb']
+            self._n = state['n']
+
+    @property
+    def count(self):
+        return self._n
+
+    def state(self):
+        return {'ata': self._ata.tolist(), 'atb': self._atb.tolist(), 'n': self._n}
+
+    def add(self, points):
+        p = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        x, y, z = p[:, 0], p[:, 1], p[:, 2]
+        if self._aligned:
+            cols = [x * x, y * y, z * z, 2 * x, 2 * y, 2 * z]
+        else:
+            cols = [x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z, 2 * x, 2 * y, 2 * z]
+        d = np.stack(cols, axis=1)
+        self._ata += d.T.dot(d)
+        self._atb += d.sum(axis=0)
+        self._n += len(p)
+
+    def solve(self, radius=None):
+        # returns (offset, transform) such that transform.dot(p - offset)
+        # lies on a sphere, by default of the mean semi axis of the fitted
+        # ellipsoid, or None while the samples do not pin the ellipsoid down
+        if self._n < len(self._atb) or np.linalg.cond(self._ata) > 1e12:
+            return None
+        s = np.linalg.solve(self._ata, self._atb)
+
+        if self._aligned:
+            m = np.diag(s[:3])
+            v = s[3:]
+        else:
+            m = np.array([[s[0], s[3], s[4]],
+                          [s[3], s[1], s[5]],
+                          [s[4], s[5], s[2]]])
+            v = s[6:]
+
+        offset = -np.linalg.solve(m, v)
+        k = 1.0 + offset.dot(m).dot(offset)
+        w, u = np.linalg.eigh(m / k)
+        if k <= 0.0 or np.any(w <= 0.0):
+            return None
+
+        if radius is None:
+            radius = np.prod(1.0 / np.sqrt(w)) ** (1.0 / 3)
+        transform = u.dot(np.diag(np.sqrt(w))).dot(u.T) * radius
+        return offset, transform
+
+
+class Calibration(object):
+
+    # corrections applied on top of the factory magnetometer adjustment:
+    # gyro bias in deg/s, accel offset in m/s^2 and per axis scale, and the
+    # magnetometer hard iron offset in uT with a soft iron transform
+
+    def __init__(self, gyro_bias=None, accel_offset=None, accel_scale=None,
+                 mag_offset=None, mag_transform=None):
+        self.gyro_bias = np.zeros(3) if gyro_bias is None else np.asarray(gyro_bias, dtype=np.float64)
+        self.accel_offset = np.zeros(3) if accel_offset is None else np.asarray(accel_offset, dtype=np.float64)
+        self.accel_scale = np.ones(3) if accel_scale is None else np.asarray(accel_scale, dtype=np.float64)
+        self.mag_offset = np.zeros(3) if mag_offset is None else np.asarray(mag_offset, dtype=np.float64)
+        self.mag_transform = np.eye(3) if mag_transform is None else np.asarray(mag_transform, dtype=np.float64)
+
+    def to_dict(self):
+        return {'gyro_bias': self.gyro_bias.tolist(),
+                'accel_offset': self.accel_offset.tolist(),
+                'accel_scale': self.accel_scale.tolist(),
+                'mag_offset': self.mag_offset.tolist(),
+                'mag_transform': self.mag_transform.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+    def gyro(self, g):
+        return np.subtract(g, self.gyro_bias, dtype=g.dtype)
+
+    def accel(self, a):
+        return np.multiply(np.subtract(a, self.accel_offset), self.accel_scale, dtype=a.dtype)
+
+    def mag(self, m):
+        # samples the decoder zeroed, not ready or saturated, stay zero
+        valid = np.any(m != 0, axis=-1)
+        # spelled out rather than a matrix product, so a sample comes out
+        # the same whether it is corrected alone or in a batch
+        out = np.zeros_like(m)
+        d = m[valid] - self.mag_offset
+        t = self.mag_transform
+        out[valid] = d[:, 0:1] * t[:, 0] + d[:, 1:2] * t[:, 1] + d[:, 2:3] * t[:, 2]
+        return out
+
+    def apply(self, data):
+        # corrects a decoded dict of (N, 3) arrays in place
+        if 'accel' in data:
+            data['accel'] = self.accel(data['accel'])
+        if 'gyro' in data:
+            data['gyro'] = self.gyro(data['gyro'])
+        if 'mag' in data:
+            data['mag'] = self.mag(data['mag'])
+        return data
+
+
+class Calibrator(object):
+
+    # collects uncalibrated batches from the MPU decoder and estimates a
+    # Calibration from them. Gyro bias and the accelerometer fit only take
+    # batches in which the board was held still, the accelerometer fit
+    # wants those in several orientations, the magnetometer fit wants the
+    # board turned through as many directions as possible
+
+    def __init__(self, still_gyro=1.0, still_accel=0.05, state=None):
+        self.still_gyro = still_gyro
+        self.still_accel = still_accel
+        state = state or {}
+        self._accel = EllipsoidFit(True, state.get('accel'))
+        self._mag = EllipsoidFit(False, state.get('mag'))
+        gyro = state.get('gyro', {'sum': [0.0] * 3, 'n': 0})
+        self._gyro_sum = np.array(gyro['sum'], dtype=np.float64)
+        self._gyro_n = gyro['n']
+
+    def state(self):
+        return {'accel': self._accel.state(), 'mag': self._mag.state(),
+                'gyro': {'sum': self._gyro_sum.tolist(), 'n': self._gyro_n}}
+
+    @property
+    def counts(self):
+        return {'gyro': self._gyro_n, 'accel': self._accel.count, 'mag': self._mag.count}
+
+    def add(self, batch):
+        gyro = np.atleast_2d(batch['gyro'])
+        accel = np.atleast_2d(batch['accel'])
+
+        # the standard deviation tells still from moving, one sample cannot
+        still = len(gyro) > 1 and np.all(gyro.std(axis=0) < self.still_gyro) and \
+            np.all(accel.std(axis=0) < self.still_accel * GRAVITY)
+        if still:
+            self._gyro_sum += gyro.sum(axis=0)
+            self._gyro_n += len(gyro)
+            self._accel.add(accel.mean(axis=0))
+
+        if batch.get('mag') is not None:
+            mag = np.atleast_2d(batch['mag'])
+            valid = np.any(mag != 0, axis=1)
+            if 'mag_ready' in batch:
+                valid &= np.atleast_1d(batch['mag_ready'])
+            if np.any(valid):
+                self._mag.add(mag[valid])
+
+        return still
+
+    def result(self, previous=None):
+        # parts without enough data yet keep their previous values
+        cal = Calibration(**previous.to_dict()) if previous is not None else Calibration()
+        if self._gyro_n > 0:
+            cal.gyro_bias = self._gyro_sum / self._gyro_n
+
+        fit = self._accel.solve(GRAVITY)
+        if fit is not None:
+            cal.accel_offset, cal.accel_scale = fit[0], np.diag(fit[1])
+
+        fit = self._mag.solve()
+        if fit is not None:
+            cal.mag_offset, cal.mag_transform = fit
+
+        return cal
@@ -0,0 +1,105 @@
+from ..header import *
+import numpy as np
+
+__all__ = ['ACCEL_FRAME', 'GYRO_FRAME', 'TEMP_FRAME', 'MOTION_FRAME', 'FIFO_FRAME', 'MAG_FRAME',
+           'MOTION_MAG_FRAME', 'FIFO_MAG_FRAME', 'BMP_FRAME', 'decode_accel', 'decode_gyro', 'decode_temp', 'decode_mag', 'decode_motion',
+           'decode_fifo', 'decode_bmp_adc']
+
+# raw register layouts, MPU registers are big endian, AK8963 little endian
+ACCEL_FRAME = np.dtype([('accel', '>i2', (3,))])
+GYRO_FRAME = np.dtype([('gyro', '>i2', (3,))])
+TEMP_FRAME = np.dtype([('temp', '>i2')])
+MOTION_FRAME = np.dtype([('accel', '>i2', (3,)), ('temp', '>i2'), ('gyro', '>i2', (3,))])
+FIFO_FRAME = np.dtype([('accel', '>i2', (3,)), ('gyro', '>i2', (3,))])
+# ST1 through ST2
+MAG_FRAME = np.dtype([('st1', 'u1'), ('mag', '<i2', (3,)), ('st2', 'u1')])
+# with the AK8963 read by the MPU I2C master into EXT_SENS_DATA, which
+# follows GYRO_ZOUT_L in the register map and gyro data in the fifo
+MOTION_MAG_FRAME = np.dtype(MOTION_FRAME.descr + MAG_FRAME.descr)
+FIFO_MAG_FRAME = np.dtype(FIFO_FRAME.descr + MAG_FRAME.descr)
+# BMP280_PRESSURE_MSB through BMP280_TEMPERATURE_XLSB, 20 bit values
+BMP_FRAME = np.dtype([('press', 'u1', (3,)), ('temp', 'u1', (3,))])
+
+
+def _frames(buf, frame):
+    # zero copy view of N raw frames
+    return np.frombuffer(buf, dtype=frame)
+
+
+def _accel(frames, accel_to_ms2, dtype):
+    return np.multiply(frames['accel'], accel_to_ms2, dtype=dtype)
+
+
+def _gyro(frames, gyro_to_degs, dtype):
+    return np.multiply(frames['gyro'], gyro_to_degs, dtype=dtype)
+
+
+def _temp(frames, dtype):
+    return np.add(np.divide(frames['temp'], TEMP_SENSITIVITY, dtype=dtype), 21.0, dtype=dtype)
+
+
+def decode_accel(buf, accel_to_ms2, dtype=np.float64):
+    return _accel(_frames(buf, ACCEL_FRAME), accel_to_ms2, dtype)
+
+
+def decode_gyro(buf, gyro_to_degs, dtype=np.float64):
+    return _gyro(_frames(buf, GYRO_FRAME), gyro_to_degs, dtype)
+
+
+def decode_temp(buf, dtype=np.float64):
+    return _temp(_frames(buf, TEMP_FRAME), dtype)
+
+
+def _mag(frames, mag_adjust, dtype, require_ready):
+    raw = frames['mag']
+
+    # swap x and y and negate z to line the magnetometer axes up with the
+    # accelerometer and gyro, then apply the factory sensitivity adjustment
+    adjust = np.array([mag_adjust[1], mag_adjust[0], -mag_adjust[2]], dtype=np.float64)
+    mag = np.multiply(raw[:, [1, 0, 2]], adjust * MAG_RAW_TO_uT, dtype=dtype)
+
+    # saturated samples read as zero, and so do samples that were not
+    # ready unless the data registers are known to hold the last reading
+    ready = (frames['st1'] & MAG_DATA_READY) > 0
+    bad = (frames['st2'] & MAGNETOMETER_SATURATION) == MAGNETOMETER_SATURATION
+    if require_ready:
+        bad |= ~ready
+    mag[bad] = 0.0
+
+    return mag, ready & ~bad
+
+
+def decode_mag(buf, mag_adjust, dtype=np.float64, require_ready=True):
+    return _mag(_frames(buf, MAG_FRAME), mag_adjust, dtype, require_ready)[0]
+
+
+def decode_motion(buf, accel_to_ms2, gyro_to_degs, dtype=np.float64, mag_adjust=None):
+    # with mag_adjust the frames carry the I2C master's magnetometer read,
+    # mag_ready marks the samples with a new measurement
+    frames = _frames(buf, MOTION_FRAME if mag_adjust is None else MOTION_MAG_FRAME)
+    data = {'accel': _accel(frames, accel_to_ms2, dtype),
+            'temp': _temp(frames, dtype),
+            'gyro': _gyro(frames, gyro_to_degs, dtype)}
+    if mag_adjust is not None:
+        data['mag'], data['mag_ready'] = _mag(frames, mag_adjust, dtype, False)
+    return data
+
+
+def decode_fifo(buf, accel_to_ms2, gyro_to_degs, dtype=np.float64, mag_adjust=None):
+    frames = _frames(buf, FIFO_FRAME if mag_adjust is None else FIFO_MAG_FRAME)
+    data = {'accel': _accel(frames, accel_to_ms2, dtype),
+            'gyro': _gyro(frames, gyro_to_degs, dtype)}
+    if mag_adjust is not None:
+        data['mag'], data['mag_ready'] = _mag(frames, mag_adjust, dtype, False)
+    return data
+
+
+def _adc20(b):
+    b = b.astype(np.int64)
+    return (b[:, 0] << 12) | (b[:, 1] << 4) | (b[:, 2] >> 4)
+
+
+def decode_bmp_adc(buf):
+    # raw adc_P and adc_T for BMP.bmp_compensate()
+    frames = _frames(buf, BMP_FRAME)
+    return _adc20(frames['press']), _adc20(frames['temp'])
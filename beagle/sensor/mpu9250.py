@@ -1,5 +1,10 @@
 from ..header import *
-import smbus
+from .bus import *
+from .decode import *
+from .cache import *
+from .calibration import *
+from .stats import *
+from ..tools import *
 import time
 import numpy as np
 
@@ -8,36 +13,89 @@ __all__ = ['MPU']
 
 class MPU(object):
 
-    def __init__(self, bus=IMU_BUS, addr=MPU_DEFAULT_I2C_ADDR, sample_rate=200):
-        self._bus = smbus.SMBus(bus)
+    def __init__(self, bus=IMU_BUS, addr=MPU_DEFAULT_I2C_ADDR, sample_rate=200, cache=None, mag_master=False,
+                 calibration=None, stats=None, retries=0):
+        self._bus = open_bus(bus)
+        # failed transactions are retried retries times, counted in stats
+        if stats is not None or retries:
+            self._bus = InstrumentedBus(self._bus, stats if stats is not None else SensorStats(), retries)
+        self._stats = stats
+        self._bus_id = bus
         self._addr = addr
+        self._cache = cache
         self._dmp_en = 1
         self._bypass_en = 0
         self._mag_factory_adjust = [0.0] * 3
+        self._user_ctrl = 0
+        self._int_status = 0
+        self._sample_rate = sample_rate
+        self._mag_master = 0
+        self._fifo_en = 0
+        self._fifo_mag = False
+        self._fifo_frame_size = FIFO_FRAME.itemsize
+        self._fifo_held = []
+        self._calibration = calibration
+        self._regs = {}
+        self._config = {}
+
+        # a calibration saved by an earlier run applies right away
+        if calibration is None and cache is not None:
+            cal = cache.get(chip_key('mpu9250-cal', bus, addr))
+            if cal is not None:
+                self._calibration = Calibration.from_dict(cal)
 
         self.__reset_mpu()
         self.__check_who_am_i()
 
-        self._bus.write_byte_data(self._addr, SMPLRT_DIV, 0x00)
+        self.__write(SMPLRT_DIV, 0x00)
         self.__set_accel_fsr(ACCEL_FSR_8G)
         self.__set_gyro_fsr(GYRO_FSR_2000DPS)
         self.__set_accel_dlpf(ACCEL_DLPF_184)
         self.__set_gyro_dlpf(GYRO_DLPF_184)
         self.__mpu_set_sample_rate(sample_rate)
         self.__init_magnetometer()
-
-        time.sleep(0.1)
-
-    def __reset_mpu(self):
-        # write the reset bit
+        if mag_master:
+            self.mpu_set_mag_master(True)
+        self.__write(INT_ENABLE, BIT_DATA_RDY_EN)
+
+        # wait for the first sample with the new configuration
+        self.__wait_sample()
+
+    def __write(self, reg, value, force=False):
+        # every register write goes through the shadow, a register that
+        # already holds the value is not written again
+        value = int(np.uint8(value))
+        if not force and self._regs.get(reg) == value:
+            return
+        self._bus.write_byte_data(self._addr, reg, value)
+        self._regs[reg] = value
+
+    def __modify(self, reg, mask, value):
+        # read-modify-write from the shadow, the chip is only read for a
+        # register that was not written since the reset
+        c = self._regs.get(reg)
+        if c is None:
+            c = self._bus.read_byte_data(self._addr, reg)
+        self.__write(reg, (c & ~mask) | (value & mask))
+
+    def __reset_done(self):
+        c = self._bus.read_byte_data(self._addr, PWR_MGMT_1)
+        return (c & H_RESET) == 0 and self.__check_who_am_i() == 0
+
+    def __write_reset(self):
         self._bus.write_byte_data(self._addr, PWR_MGMT_1, H_RESET)
+        self._regs = {}
+        return True
 
-        # wait and try again
-        time.sleep(0.1)
-        self._bus.write_byte_data(self._addr, PWR_MGMT_1, H_RESET)
-        time.sleep(0.1)
+    def __reset_mpu(self):
+        # write the reset bit and wait until the chip answers again,
+        # if it does not try once more
+        for i in range(2):
+            if poll_until(self.__write_reset, MPU_RESET_TIMEOUT) and \
+                    poll_until(self.__reset_done, MPU_RESET_TIMEOUT):
+                return 0
 
-        return 0
+        raise IOError('MPU9250 at 0x%02x did not come out of reset' % self._addr)
 
     def __init_magnetometer(self):
         if self.__mpu_set_bypass(1) < 0:
@@ -45,56 +103,61 @@ class MPU(object):
 
         # Power down magnetometer
         self._bus.write_byte_data(AK8963_ADDR, AK8963_CNTL, MAG_POWER_DN)
-        time.sleep(0.01)
+        time.sleep(MAG_MODE_SETTLE)
 
         #  Enter Fuse ROM access mode
         self._bus.write_byte_data(AK8963_ADDR, AK8963_CNTL, MAG_FUSE_ROM)
-        time.sleep(0.01)
+        time.sleep(MAG_MODE_SETTLE)
 
         raw = self._bus.read_i2c_block_data(AK8963_ADDR, AK8963_ASAX, 3)
 
+        # Power down magnetometer again
+        self._bus.write_byte_data(AK8963_ADDR, AK8963_CNTL, MAG_POWER_DN)
+        time.sleep(MAG_MODE_SETTLE)
+
         # Return sensitivity adjustment values
         self._mag_factory_adjust[0] = (raw[0] - 128) / 256.0 + 1.0
         self._mag_factory_adjust[1] = (raw[1] - 128) / 256.0 + 1.0
         self._mag_factory_adjust[2] = (raw[2] - 128) / 256.0 + 1.0
 
-        # Power down magnetometer again
-        self._bus.write_byte_data(AK8963_ADDR, AK8963_CNTL, MAG_POWER_DN)
-        time.sleep(0.01)
-
         # Configure the magnetometer for 16 bit resolution
         # and continuous sampling mode 2 (100hz)
         c = MSCALE_16 | MAG_CONT_MES_2
         self._bus.write_byte_data(AK8963_ADDR, AK8963_CNTL, c)
-        time.sleep(0.01)
 
         return 0
 
+    def __mag_present(self):
+        return self._bus.read_byte_data(AK8963_ADDR, 0) == WHO_AM_I_AK8963
+
     def __mpu_set_bypass(self, bypass_on):
         tmp = 0
         if self._dmp_en > 0:
             tmp |= FIFO_EN_BIT
         if bypass_on == 0:
             tmp |= I2C_MST_EN
-        self._bus.write_byte_data(self._addr, USER_CTRL, tmp)
-
-        time.sleep(0.03)
+        self.__write(USER_CTRL, tmp)
+        self._user_ctrl = tmp
 
         # INT_PIN_CFG settings
         tmp = LATCH_INT_EN | INT_ANYRD_CLEAR | ACTL_ACTIVE_LOW
         if bypass_on > 0:
             tmp |= BYPASS_EN
-        self._bus.write_byte_data(self._addr, INT_PIN_CFG, tmp)
+        self.__write(INT_PIN_CFG, tmp)
         if bypass_on > 0:
             self._bypass_en = 1
         else:
             self._bypass_en = 0
 
+        # the magnetometer shows up on the host bus once the mux switched
+        if bypass_on > 0 and not poll_until(self.__mag_present, MAG_BYPASS_TIMEOUT):
+            return -1
+
         return 0
 
     def __check_who_am_i(self):
-        c = self._bus.read_byte_data(self._addr, 0)
-        if c != 0x71:
+        c = self._bus.read_byte_data(self._addr, WHO_AM_I)
+        if c != WHO_AM_I_MPU9250:
             return -1
 
         return 0
@@ -103,7 +166,9 @@ class MPU(object):
         if rate > 1000 or rate < 4:
             raise ValueError('sample rate must be between 4 & 1000')
         div = int(np.uint8(1000 / rate - 1))
-        self._bus.write_byte_data(self._addr, SMPLRT_DIV, div)
+        self.__write(SMPLRT_DIV, div)
+        self._sample_rate = 1000.0 / (div + 1)
+        self._config['sample_rate'] = self._sample_rate
 
         return 0
 
@@ -123,8 +188,8 @@ class MPU(object):
         else:
             return -1
 
-        c = int(np.uint8(c))
-        self._bus.write_byte_data(self._addr, ACCEL_CONFIG, c)
+        self.__write(ACCEL_CONFIG, c)
+        self._config['accel_fsr'] = fsr
         return 0
 
     def __set_gyro_fsr(self, fsr):
@@ -143,8 +208,8 @@ class MPU(object):
         else:
             return -1
 
-        c = int(np.uint8(c))
-        self._bus.write_byte_data(self._addr, GYRO_CONFIG, c)
+        self.__write(GYRO_CONFIG, c)
+        self._config['gyro_fsr'] = fsr
         return 0
 
     def __set_accel_dlpf(self, dlpf):
@@ -168,12 +233,12 @@ class MPU(object):
         else:
             return -1
 
-        c = int(np.uint8(c))
-        self._bus.write_byte_data(self._addr, ACCEL_CONFIG_2, c)
+        self.__write(ACCEL_CONFIG_2, c)
+        self._config['accel_dlpf'] = dlpf
         return 0
 
     def __set_gyro_dlpf(self, dlpf):
-        c = FIFO_MODE_REPLACE_OLD
+        c = 0
         if dlpf == GYRO_DLPF_OFF:
             c |= 7
         elif dlpf == GYRO_DLPF_250:
@@ -193,84 +258,342 @@ class MPU(object):
         else:
             return -1
 
-        c = int(np.uint8(c))
-        self._bus.write_byte_data(self._addr, CONFIG, c)
+        # the fifo mode bit in the same register is left alone
+        self.__modify(CONFIG, BITS_LPF, c)
+        self._config['gyro_dlpf'] = dlpf
         return 0
 
-    def mpu_read_accel(self):
-        raw = self._bus.read_i2c_block_data(self._addr, ACCEL_XOUT_H, 6)
+    def __fifo_reset(self):
+        # stop the fifo, flush it and turn it back on, the reset bit clears
+        # itself so these writes are never skipped
+        self.__write(FIFO_EN, 0x00)
+        c = (self._user_ctrl & ~FIFO_EN_BIT) | BIT_FIFO_RST
+        self.__write(USER_CTRL, c, force=True)
+        self.__write(USER_CTRL, self._user_ctrl | FIFO_EN_BIT, force=True)
+        self.__write(FIFO_EN, self._fifo_en)
+
+        # clear a stale overflow flag
+        self.__int_status()
+        self._int_status &= ~BIT_FIFO_OVERFLOW
+        return 0
+
+    def __int_status(self):
+        # INT_STATUS clears on read, keep the bits nobody has consumed yet
+        self._int_status |= self._bus.read_byte_data(self._addr, INT_STATUS)
+        return self._int_status
+
+    def __wait_sample(self):
+        # a ready flag raised before now belongs to an older sample
+        self.__int_status()
+        self._int_status &= ~RAW_DATA_RDY_INT
+        if not poll_until(self.mpu_data_ready, MPU_DATA_TIMEOUT):
+            raise IOError('MPU9250 at 0x%02x produced no data' % self._addr)
+
+    def mpu_set_motion_interrupt(self, threshold_mg=None):
+        # the wake-on-motion logic alongside normal sampling: WOM_INT goes up
+        # when an accel axis moves more than threshold_mg from one sample to
+        # the next, the chip does the comparing and mpu_motion() only reads
+        # INT_STATUS. None turns it off
+        if threshold_mg is None:
+            self.__write(INT_ENABLE, BIT_DATA_RDY_EN)
+            self.__write(ACCEL_INTEL_CTRL, 0x00)
+            self._int_status &= ~WOM_INT
+            return 0
+        if threshold_mg < 0 or threshold_mg > 255 * WOM_THR_MG:
+            raise ValueError('threshold must be between 0 & %d mg' % (255 * WOM_THR_MG))
+
+        self.__write(WOM_THR, int(round(threshold_mg / WOM_THR_MG)))
+        self.__write(ACCEL_INTEL_CTRL, ACCEL_INTEL_EN | ACCEL_INTEL_MODE)
+        self.__write(INT_ENABLE, BIT_DATA_RDY_EN | BIT_MOT_INT_EN)
+        return 0
+
+    def mpu_motion(self):
+        # motion since the last call
+        if self.__int_status() & WOM_INT:
+            self._int_status &= ~WOM_INT
+            return True
+        return False
+
+    def mpu_data_ready(self):
+        if self.__int_status() & RAW_DATA_RDY_INT:
+            self._int_status &= ~RAW_DATA_RDY_INT
+            return True
+        return False
+
+    def mpu_fifo_start(self):
+        # keep the oldest frames once the fifo is full so that the stream
+        # never loses frame alignment, overflow is reported instead
+        self.__modify(CONFIG, FIFO_MODE_KEEP_OLD, FIFO_MODE_KEEP_OLD)
+
+        # accel and gyro frames, 12 bytes each, plus the 8 bytes the I2C
+        # master reads from the magnetometer when it is on
+        self._fifo_en = FIFO_ACCEL | FIFO_GYRO_XOUT | FIFO_GYRO_YOUT | FIFO_GYRO_ZOUT
+        self._fifo_frame_size = FIFO_FRAME.itemsize
+        self._fifo_mag = self._mag_master > 0
+        if self._fifo_mag:
+            self._fifo_en |= FIFO_SLV0
+            self._fifo_frame_size = FIFO_MAG_FRAME.itemsize
+        return self.__fifo_reset()
+
+    def mpu_fifo_stop(self):
+        self._fifo_en = 0
+        self._fifo_held = []
+        self.__write(FIFO_EN, 0x00)
+        c = (self._user_ctrl & ~FIFO_EN_BIT) | BIT_FIFO_RST
+        self.__write(USER_CTRL, c, force=True)
+        self.__write(USER_CTRL, self._user_ctrl, force=True)
+        return 0
+
+    def mpu_fifo_fill_time(self):
+        # seconds from empty to full at the current sample rate
+        return (FIFO_SIZE // self._fifo_frame_size) / self._sample_rate
+
+    def mpu_read_fifo(self):
+        # frames drained by mpu_configure() come first, as batches of their
+        # own with the scales they were recorded at
+        if self._fifo_held:
+            return self._fifo_held.pop(0)
+
+        data = self.__fifo_drain()
+        if data['overflow']:
+            self.__fifo_reset()
+        return data
+
+    def __fifo_drain(self):
+        status = self.__int_status()
+        self._int_status &= ~BIT_FIFO_OVERFLOW
+        raw = self._bus.read_i2c_block_data(self._addr, FIFO_COUNTH, 2)
+        read_time = time.monotonic()
+        count = ((raw[0] & FIFO_COUNTH_MASK) << 8) | raw[1]
+
+        # once there is no room left for another whole frame the tail of the
+        # fifo may hold a partial frame, so treat it like an overflow
+        overflow = (status & BIT_FIFO_OVERFLOW) > 0 or count > FIFO_SIZE - self._fifo_frame_size
+
+        # only drain whole frames so the stream stays aligned
+        count -= count % self._fifo_frame_size
+        buf = bytearray()
+        while len(buf) < count:
+            n = min(I2C_BLOCK_MAX, count - len(buf))
+            buf += bytearray(self._bus.read_i2c_block_data(self._addr, FIFO_R_W, n))
+
+        if self._stats is not None:
+            self._stats.count('fifo_frames', count // self._fifo_frame_size)
+            if overflow:
+                self._stats.count('fifo_overflows')
+
+        # read_time is when the newest frame was known to be in the fifo,
+        # for SampleClock.stamp()
+        data = self.mpu_decode_fifo(buf)
+        data['overflow'] = overflow
+        data['read_time'] = read_time
+        data['scales'] = {'accel_to_ms2': self._accel_to_ms2,
+                          'gyro_to_degs': self._gyro_to_degs,
+                          'sample_rate': self._sample_rate}
+
+        return data
+
+    def mpu_set_sample_rate(self, rate):
+        return self.mpu_configure(sample_rate=rate)
+
+    def mpu_config(self):
+        return dict(self._config)
+
+    def mpu_configure(self, accel_fsr=None, gyro_fsr=None, accel_dlpf=None, gyro_dlpf=None, sample_rate=None):
+        # change the settings of a running sensor without a reset, only the
+        # registers whose value changes are written. With the fifo running,
+        # the frames recorded so far are drained first and decoded at the
+        # old scales, mpu_read_fifo() hands them out before any frame taken
+        # with the new settings
+        if sample_rate is not None and (sample_rate > 1000 or sample_rate < 4):
+            raise ValueError('sample rate must be between 4 & 1000')
+        if accel_fsr not in (None,) + ACCEL_FSRS or gyro_fsr not in (None,) + GYRO_FSRS or \
+                accel_dlpf not in (None,) + ACCEL_DLPFS or gyro_dlpf not in (None,) + GYRO_DLPFS:
+            return -1
+
+        scales = (self._accel_to_ms2, self._gyro_to_degs, self._sample_rate)
+        rescale = (accel_fsr not in (None, self._config['accel_fsr']) or
+                   gyro_fsr not in (None, self._config['gyro_fsr']) or
+                   (sample_rate is not None and int(np.uint8(1000 / sample_rate - 1)) != self._regs.get(SMPLRT_DIV)))
+
+        fifo = self._fifo_en
+        if rescale and fifo:
+            self.__write(FIFO_EN, 0x00)
+            data = self.__fifo_drain()
+            if len(data['accel']) or data['overflow']:
+                self._fifo_held.append(data)
+
+        if accel_fsr is not None:
+            self.__set_accel_fsr(accel_fsr)
+        if gyro_fsr is not None:
+            self.__set_gyro_fsr(gyro_fsr)
+        if accel_dlpf is not None:
+            self.__set_accel_dlpf(accel_dlpf)
+        if gyro_dlpf is not None:
+            self.__set_gyro_dlpf(gyro_dlpf)
+        if sample_rate is not None:
+            self.__mpu_set_sample_rate(sample_rate)
+
+        if rescale and fifo:
+            self.__fifo_reset()
+        elif scales != (self._accel_to_ms2, self._gyro_to_degs, self._sample_rate):
+            # the data registers still hold a sample taken at the old
+            # scale, wait for one taken at the new
+            self.__wait_sample()
+
+        return 0
+
+    def mpu_set_mag_master(self, on=True):
+        # let the MPU's own I2C master fetch AK8963_ST1..AK8963_ST2 into
+        # EXT_SENS_DATA_00 every sample, so the magnetometer comes along with
+        # the motion burst and the fifo instead of costing host transactions
+        if on:
+            c = WAIT_FOR_ES | I2C_MST_P_NSR | I2C_MST_CLK_400
+            self.__write(I2C_MST_CTRL, c)
+            self.__write(I2C_SLV0_ADDR, AK8963_ADDR | I2C_READ_FLAG)
+            self.__write(I2C_SLV0_REG, AK8963_ST1)
+            self.__write(I2C_SLV0_CTRL, I2C_SLV_EN | MAG_FRAME.itemsize)
+            if self.__mpu_set_bypass(0) < 0:
+                return -1
+        else:
+            self.__write(I2C_SLV0_CTRL, 0x00)
+            if self.__mpu_set_bypass(1) < 0:
+                return -1
+
+        self._mag_master = 1 if on else 0
+
+        # the fifo frame layout changes with it
+        if self._fifo_en:
+            self.mpu_fifo_start()
 
-        # Turn the MSB and LSB into a signed 16-bit value
-        ax_raw = np.int16(np.uint16(raw[0] << 8) | raw[1])
-        ay_raw = np.int16(np.uint16(raw[2] << 8) | raw[3])
-        az_raw = np.int16(np.uint16(raw[4] << 8) | raw[5])
+        return 0
+
+    def mpu_calibration(self):
+        return self._calibration
+
+    def mpu_set_calibration(self, calibration, save=True):
+        # None reads uncalibrated data again, which is what a Calibrator
+        # has to be fed
+        self._calibration = calibration
+        if save and self._cache is not None:
+            key = chip_key('mpu9250-cal', self._bus_id, self._addr)
+            if calibration is None:
+                self._cache.clear(key)
+            else:
+                self._cache.put(key, calibration.to_dict())
+        return 0
 
-        # Fill in real unit values and apply calibration
-        ax = ax_raw * self._accel_to_ms2 / 1.0
-        ay = ay_raw * self._accel_to_ms2 / 1.0
-        az = az_raw * self._accel_to_ms2 / 1.0
+    def mpu_scales(self):
+        # everything needed to turn raw register values into units
+        scales = {'accel_to_ms2': self._accel_to_ms2,
+                  'gyro_to_degs': self._gyro_to_degs,
+                  'mag_factory_adjust': list(self._mag_factory_adjust),
+                  'mag_master': self._mag_master > 0,
+                  'sample_rate': self._sample_rate}
+        if self._calibration is not None:
+            scales['calibration'] = self._calibration.to_dict()
+        return scales
+
+    def __calibrate(self, data):
+        if self._calibration is not None:
+            self._calibration.apply(data)
+        return data
+
+    def mpu_decode_fifo(self, buf, dtype=np.float64):
+        # N frames of accel xyz followed by gyro xyz, and the magnetometer
+        # if the fifo was started with the I2C master on
+        mag_adjust = self._mag_factory_adjust if self._fifo_mag else None
+        return self.__calibrate(decode_fifo(buf, self._accel_to_ms2, self._gyro_to_degs, dtype, mag_adjust))
+
+    def mpu_decode_motion(self, buf, dtype=np.float64, mag=False):
+        # N frames of the 14 byte ACCEL_XOUT_H..GYRO_ZOUT_L window, or of the
+        # 22 byte window through EXT_SENS_DATA_07 with mag
+        mag_adjust = self._mag_factory_adjust if mag else None
+        return self.__calibrate(decode_motion(buf, self._accel_to_ms2, self._gyro_to_degs, dtype, mag_adjust))
+
+    def mpu_decode_mag(self, buf, dtype=np.float64, require_ready=True):
+        # N frames of the 8 byte AK8963_ST1..AK8963_ST2 window
+        mag = decode_mag(buf, self._mag_factory_adjust, dtype, require_ready)
+        return self.__calibrate({'mag': mag})['mag']
+
+    def mpu_read_motion(self, mag=False):
+        # ACCEL_XOUT_H through GYRO_ZOUT_L is one contiguous window, so a
+        # single burst gives accel, temp and gyro from the same sample, with
+        # the I2C master on the magnetometer follows in EXT_SENS_DATA
+        master = mag and self._mag_master > 0
+        frame = MOTION_MAG_FRAME if master else MOTION_FRAME
+        raw = self._bus.read_i2c_block_data(self._addr, ACCEL_XOUT_H, frame.itemsize)
+        motion = self.mpu_decode_motion(bytes(raw), mag=master)
+
+        data = _vec3(('ax', 'ay', 'az'), motion['accel'][0])
+        data['temp'] = round(float(motion['temp'][0]), 2)
+        data.update(_vec3(('gx', 'gy', 'gz'), motion['gyro'][0]))
+
+        if master:
+            data.update(_vec3(('mx', 'my', 'mz'), motion['mag'][0]))
+        elif mag:
+            data.update(self.mpu_read_mag())
+
+        return data
+
+    def mpu_read_motion_raw(self):
+        # the undecoded ACCEL_XOUT_H..GYRO_ZOUT_L window, MOTION_FRAME
+        return bytes(self._bus.read_i2c_block_data(self._addr, ACCEL_XOUT_H, MOTION_FRAME.itemsize))
 
-        # Format number for necessary precision
-        ax = round(ax, 4)
-        ay = round(ay, 4)
-        az = round(az, 4)
+    def mpu_read_accel(self):
+        raw = self._bus.read_i2c_block_data(self._addr, ACCEL_XOUT_H, 6)
+        accel = self.__calibrate({'accel': decode_accel(bytes(raw), self._accel_to_ms2)})['accel']
 
-        return {'ax': ax, 'ay': ay, 'az': az}
+        return _vec3(('ax', 'ay', 'az'), accel[0])
 
     def mpu_read_gyro(self):
         raw = self._bus.read_i2c_block_data(self._addr, GYRO_XOUT_H, 6)
+        gyro = self.__calibrate({'gyro': decode_gyro(bytes(raw), self._gyro_to_degs)})['gyro']
+
+        return _vec3(('gx', 'gy', 'gz'), gyro[0])
 
-        # Turn the MSB and LSB into a signed 16-bit value
-        gx_raw = np.int16(np.int16(raw[0] << 8) | raw[1])
-        gy_raw = np.int16(np.int16(raw[2] << 8) | raw[3])
-        gz_raw = np.int16(np.int16(raw[4] << 8) | raw[5])
+    def mpu_poll_mag_raw(self):
+        # the undecoded AK8963_ST1..AK8963_ST2 window, MAG_FRAME, or None
+        # when there is no new measurement
+        if self._mag_master > 0:
+            # the I2C master keeps EXT_SENS_DATA at the latest measurement,
+            # it also consumes the ready flag so that is not waited for
+            return bytes(self._bus.read_i2c_block_data(self._addr, EXT_SENS_DATA_00, MAG_FRAME.itemsize))
 
-        # Fill in real unit values and apply calibration
-        gx = gx_raw * self._gyro_to_degs / 1.0
-        gy = gy_raw * self._gyro_to_degs / 1.0
-        gz = gz_raw * self._gyro_to_degs / 1.0
+        # ST1, the data and ST2 in one transaction, reading ST2 also
+        # releases the data registers for the next measurement
+        raw = self._bus.read_i2c_block_data(AK8963_ADDR, AK8963_ST1, MAG_FRAME.itemsize)
+        if (raw[0] & MAG_DATA_READY) == 0:
+            return None
 
-        # Format number for necessary precision
-        gx = round(gx, 4)
-        gy = round(gy, 4)
-        gz = round(gz, 4)
+        return bytes(raw)
 
-        return {'gx': gx, 'gy': gy, 'gz': gz}
+    def mpu_poll_mag(self):
+        raw = self.mpu_poll_mag_raw()
+        if raw is None:
+            return None
+
+        # saturated readings, such as because of a local field source,
+        # are discarded by the decoder
+        mag = self.mpu_decode_mag(raw, require_ready=self._mag_master == 0)
+
+        return _vec3(('mx', 'my', 'mz'), mag[0])
 
     def mpu_read_mag(self):
-        mx, my, mz = 0, 0, 0
-        st1 = self._bus.read_byte_data(AK8963_ADDR, AK8963_ST1)
-        if (st1 & MAG_DATA_READY) > 0:
-            raw = self._bus.read_i2c_block_data(AK8963_ADDR, AK8963_XOUT_L, 7)
-
-            # check if the readings saturated such as because
-            # of a local field source, discard data if so
-            if (raw[6] & MAGNETOMETER_SATURATION) != MAGNETOMETER_SATURATION:
-                # Turn the MSB and LSB into a signed 16-bit value
-                # Data stored as little Endian
-                mx_raw = np.int16(np.int16(raw[1] << 8) | raw[0])
-                my_raw = np.int16(np.int16(raw[3] << 8) | raw[2])
-                mz_raw = np.int16(np.int16(raw[5] << 8) | raw[4])
-
-                # multiply by the sensitivity adjustment and convert to units of uT micro
-                # Teslas. Also correct the coordinate system as someone in InvenSense
-                # thought it would be bright idea to have the magnetometer coordinate
-                # system aligned differently than the accelerometer and gyro.... -__-
-                mx = my_raw * self._mag_factory_adjust[1] * MAG_RAW_TO_uT
-                my = mx_raw * self._mag_factory_adjust[0] * MAG_RAW_TO_uT
-                mz = -mz_raw * self._mag_factory_adjust[2] * MAG_RAW_TO_uT
-
-                # Format number for necessary precision
-                mx = round(mx, 4)
-                my = round(my, 4)
-                mz = round(mz, 4)
-
-        return {'mx': mx, 'my': my, 'mz': mz}
+        mag = self.mpu_poll_mag()
+        if mag is None:
+            return {'mx': 0, 'my': 0, 'mz': 0}
+
+        return mag
 
     def mpu_read_temp(self):
         raw = self._bus.read_i2c_block_data(self._addr, TEMP_OUT_H, 2)
-        temp_raw = np.uint16(np.int16(raw[0] << 8) | raw[1])
-        temp = 21.0 + temp_raw / TEMP_SENSITIVITY
-        temp = round(temp, 2)
+        temp = decode_temp(bytes(raw))
+
+        return round(float(temp[0]), 2)
+
 
-        return temp
+def _vec3(keys, v):
+    # Format number for necessary precision
+    x, y, z = v.tolist()
+    return {keys[0]: round(x, 4), keys[1]: round(y, 4), keys[2]: round(z, 4)}
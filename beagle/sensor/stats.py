@@ -0,0 +1,170 @@
+import time
+
+__all__ = ['Histogram', 'SensorStats', 'InstrumentedBus']
+
+HIST_BUCKETS = 24
+
+
+class Histogram(object):
+
+    # log2 buckets of microseconds, bucket i holds [2^(i-1), 2^i) us and
+    # bucket 0 everything under 1 us, so adding a value is a few integer
+    # operations and the memory is fixed
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts is not None else [0] * HIST_BUCKETS
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        us = int(seconds * 1e6)
+        i = us.bit_length() if us > 0 else 0
+        self.counts[min(i, HIST_BUCKETS - 1)] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def mean(self):
+        n = self.count
+        return self.total / n if n else 0.0
+
+    def percentile(self, p):
+        # upper edge of the bucket the p-th percentile falls in, seconds
+        n = self.count
+        if n == 0:
+            return 0.0
+        want = p / 100.0 * n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= want:
+                return (1 << i) * 1e-6
+        return self.max
+
+    def since(self, counts):
+        # the samples added after counts was taken from this histogram
+        return Histogram([a - b for a, b in zip(self.counts, counts)])
+
+    def snapshot(self):
+        return {'counts': list(self.counts), 'count': self.count, 'mean': self.mean, 'max': self.max,
+                'p50': self.percentile(50), 'p99': self.percentile(99)}
+
+
+class SensorStats(object):
+
+    # counters and histograms shared by the instrumented buses, sensors and
+    # schedulers of one acquisition. Updates take no lock, a count that
+    # races with another thread may be off by one, which is fine here.
+    #
+    # counters: bus_errors, bus_retries, fifo_overflows, fifo_frames,
+    # missed (scheduler deadlines), not_ready, read_errors
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.latency = {}
+        self.jitter = Histogram()
+        self.counters = {}
+        self.reset()
+
+    def reset(self):
+        self.latency = {}
+        self.jitter = Histogram()
+        self.counters = {}
+        self._started = self._clock()
+        self._last = None
+
+    def bus_latency(self, op):
+        h = self.latency.get(op)
+        if h is None:
+            h = self.latency[op] = Histogram()
+        return h
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        return {'elapsed': self._clock() - self._started,
+                'latency': dict((op, h.snapshot()) for op, h in self.latency.items()),
+                'jitter': self.jitter.snapshot(),
+                'counters': dict(self.counters)}
+
+    def __merged(self):
+        merged = Histogram()
+        for h in self.latency.values():
+            merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+            merged.max = max(merged.max, h.max)
+        return merged
+
+    def status_line(self):
+        # bus and jitter figures since the previous status line, the
+        # counters since the start
+        now = self._clock()
+        bus = self.__merged()
+        t, bus_counts, jitter_counts = self._last or (self._started, [0] * HIST_BUCKETS, [0] * HIST_BUCKETS)
+        self._last = (now, list(bus.counts), list(self.jitter.counts))
+        window = bus.since(bus_counts)
+        jitter = self.jitter.since(jitter_counts)
+
+        c = self.counters
+        rate = window.count / (now - t) if now > t else 0.0
+        return ('bus %d txn/s p50 %s p99 %s max %s | errors %d retries %d | '
+                'fifo overflows %d | missed %d not ready %d read errors %d | jitter p99 %s'
+                % (rate, _us(window.percentile(50)), _us(window.percentile(99)), _us(bus.max),
+                   c.get('bus_errors', 0), c.get('bus_retries', 0), c.get('fifo_overflows', 0),
+                   c.get('missed', 0), c.get('not_ready', 0), c.get('read_errors', 0),
+                   _us(jitter.percentile(99))))
+
+
+def _us(seconds):
+    if seconds >= 1e-3:
+        return '%.1fms' % (seconds * 1e3)
+    return '%dus' % (seconds * 1e6)
+
+
+class InstrumentedBus(object):
+
+    # wraps a bus object, times every transaction into stats and retries
+    # the ones that fail with an IOError up to retries times. Only sensors
+    # created with stats pay for it, the plain bus is used otherwise
+
+    def __init__(self, bus, stats, retries=0, clock=time.perf_counter):
+        self.bus = bus
+        self.stats = stats
+        self.retries = retries
+        self._clock = clock
+
+    def __call(self, op, fn, args):
+        hist = self.stats.bus_latency(op)
+        attempt = 0
+        while True:
+            t0 = self._clock()
+            try:
+                return fn(*args)
+            except IOError:
+                self.stats.count('bus_errors')
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.stats.count('bus_retries')
+            finally:
+                hist.add(self._clock() - t0)
+
+    def read_byte_data(self, addr, reg):
+        return self.__call('read_byte_data', self.bus.read_byte_data, (addr, reg))
+
+    def write_byte_data(self, addr, reg, val):
+        return self.__call('write_byte_data', self.bus.write_byte_data, (addr, reg, val))
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        return self.__call('read_i2c_block_data', self.bus.read_i2c_block_data, (addr, reg, length))
+
+    def write_i2c_block_data(self, addr, reg, data):
+        return self.__call('write_i2c_block_data', self.bus.write_i2c_block_data, (addr, reg, data))
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
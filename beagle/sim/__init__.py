@@ -0,0 +1,5 @@
+from .device import *
+from .mpu9250 import *
+from .ak8963 import *
+from .bmp280 import *
+from .bus import *
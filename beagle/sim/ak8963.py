@@ -0,0 +1,82 @@
+from ..header import *
+from .device import *
+import math
+import time
+
+__all__ = ['SimAK8963']
+
+MAG_DATA_OVERRUN = 0x02
+MAG_BIT_16 = 0x10
+
+
+class SimAK8963(SimDevice):
+
+    def __init__(self, gate=None, clock=time.monotonic, asa=(176, 177, 165)):
+        SimDevice.__init__(self, clock)
+        self._gate = gate
+        self._asa = asa
+        self.reset()
+
+    def reset(self):
+        self.regs = bytearray(256)
+        self.regs[0] = WHO_AM_I_AK8963
+        self.regs[AK8963_ASAX:AK8963_ASAZ + 1] = bytearray(self._asa)
+        self._k = 0
+        self._t = self._clock()
+
+    def present(self):
+        # only reachable from the host bus while the MPU bypass mux is on
+        return self._gate is None or self._gate()
+
+    def rate(self):
+        mode = self.regs[AK8963_CNTL] & 0x0F
+        if mode == MAG_CONT_MES_1:
+            return 8.0
+        if mode == MAG_CONT_MES_2:
+            return 100.0
+        return 0.0
+
+    def measure(self):
+        # a slowly turning heading in a 45 uT field
+        t = self._k / 100.0
+        field = (25.0 * math.cos(0.1 * math.pi * t),
+                 25.0 * math.sin(0.1 * math.pi * t),
+                 -37.0)
+
+        for i in range(3):
+            adj = (self._asa[i] - 128) / 256.0 + 1.0
+            raw = int(round(field[i] / (MAG_RAW_TO_uT * adj)))
+            raw &= 0xFFFF
+            self.regs[AK8963_XOUT_L + 2 * i] = raw & 0xFF
+            self.regs[AK8963_XOUT_L + 2 * i + 1] = raw >> 8
+
+        if self.regs[AK8963_ST1] & MAG_DATA_READY:
+            self.regs[AK8963_ST1] |= MAG_DATA_OVERRUN
+        self.regs[AK8963_ST1] |= MAG_DATA_READY
+        self.regs[AK8963_ST2] = MAG_BIT_16 if self.regs[AK8963_CNTL] & MSCALE_16 else 0
+
+    def update(self):
+        now = self._clock()
+        rate = self.rate()
+        if rate == 0:
+            self._t = now
+            return
+
+        n = int((now - self._t) * rate)
+        if n > 0:
+            self._k += n
+            self._t += n / rate
+            self.measure()
+
+    def read_reg(self, reg):
+        c = self.regs[reg]
+        if reg == AK8963_ST2:
+            # reading ST2 ends the read cycle
+            self.regs[AK8963_ST1] &= ~(MAG_DATA_READY | MAG_DATA_OVERRUN)
+        return c
+
+    def write_reg(self, reg, val):
+        self.regs[reg] = val
+        if reg == AK8963_CNTL and (val & 0x0F) == MAG_SINGLE_MES:
+            self.measure()
+            self.regs[AK8963_CNTL] = val & ~0x0F
@@ -0,0 +1,77 @@
+from ..header import *
+from .device import *
+import math
+import struct
+import time
+
+__all__ = ['SimBMP280']
+
+# the worked example from the BMP280 datasheet
+DATASHEET_CAL = (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+DATASHEET_ADC_T = 519888
+DATASHEET_ADC_P = 415148
+
+OVERSAMPLE_N = (0, 1, 2, 4, 8, 16, 16, 16)
+STANDBY_MS = (0.5, 62.5, 125.0, 250.0, 500.0, 1000.0, 2000.0, 4000.0)
+NVM_COPY_S = 0.002
+
+
+class SimBMP280(SimDevice):
+
+    def __init__(self, clock=time.monotonic, cal=DATASHEET_CAL):
+        SimDevice.__init__(self, clock)
+        self._cal = cal
+        self.reset()
+
+    def reset(self):
+        self.regs = bytearray(256)
+        self.regs[BMP280_CHIP_ID_REG] = BMP280_CHIP_ID
+        self.regs[BMP280_DIG_T1:BMP280_DIG_T1 + 24] = struct.pack('<HhhHhhhhhhhh', *self._cal)
+        # data registers read 0x80000 until the first conversion
+        self.regs[BMP280_PRESSURE_MSB:BMP280_TEMPERATURE_XLSB + 1] = bytearray([0x80, 0, 0, 0x80, 0, 0])
+        self._nvm_ready = self._clock() + NVM_COPY_S
+        self._k = 0
+        self._t = self._clock()
+
+    def period(self):
+        ctrl = self.regs[BMP280_CTRL_MEAS]
+        osrs_t = OVERSAMPLE_N[(ctrl >> 5) & 0x07]
+        osrs_p = OVERSAMPLE_N[(ctrl >> 2) & 0x07]
+        ms = 1.25 + 2.3 * osrs_t
+        if osrs_p:
+            ms += 2.3 * osrs_p + 0.575
+        return (ms + STANDBY_MS[self.regs[BMP280_CONFIG] >> 5]) / 1000.0
+
+    def measure(self):
+        t = self._k * self.period()
+        adc_p = DATASHEET_ADC_P + int(40 * math.sin(0.2 * math.pi * t))
+        adc_t = DATASHEET_ADC_T
+        for reg, adc in ((BMP280_PRESSURE_MSB, adc_p), (BMP280_TEMPERATURE_MSB, adc_t)):
+            self.regs[reg] = (adc >> 12) & 0xFF
+            self.regs[reg + 1] = (adc >> 4) & 0xFF
+            self.regs[reg + 2] = (adc << 4) & 0xF0
+
+    def update(self):
+        now = self._clock()
+        if (self.regs[BMP280_CTRL_MEAS] & 0x03) != BMP_MODE_NORMAL:
+            self._t = now
+            return
+
+        period = self.period()
+        n = int((now - self._t) / period)
+        if n > 0:
+            self._k += n
+            self._t += n * period
+            self.measure()
+
+    def read_reg(self, reg):
+        if reg == BMP280_STATUS_REG:
+            return BMP280_IM_UPDATE_STATUS if self._clock() < self._nvm_ready else 0
+        return self.regs[reg]
+
+    def write_reg(self, reg, val):
+        if reg == BMP280_RESET_REG:
+            if val == BMP280_RESET_WORD:
+                self.reset()
+            return
+        self.regs[reg] = val
@@ -0,0 +1,61 @@
+from ..header import *
+from .mpu9250 import *
+from .ak8963 import *
+from .bmp280 import *
+import errno
+import time
+
+__all__ = ['SimBus', 'sim_board']
+
+
+class SimBus(object):
+
+    def __init__(self, devices=None, latency=0.0):
+        self.devices = dict(devices or {})
+        self.latency = latency
+        self.transactions = 0
+
+    def attach(self, addr, device):
+        self.devices[addr] = device
+        return device
+
+    def __device(self, addr):
+        self.transactions += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        dev = self.devices.get(addr)
+        if dev is None or not dev.present():
+            raise IOError(errno.EREMOTEIO, 'Remote I/O error')
+
+        return dev
+
+    def read_byte_data(self, addr, reg):
+        return self.__device(addr).read(reg, 1)[0]
+
+    def write_byte_data(self, addr, reg, val):
+        self.__device(addr).write(reg, [val])
+
+    def read_i2c_block_data(self, addr, reg, length=I2C_BLOCK_MAX):
+        if length > I2C_BLOCK_MAX:
+            raise ValueError('block transfers are limited to %d bytes' % I2C_BLOCK_MAX)
+        return self.__device(addr).read(reg, length)
+
+    def write_i2c_block_data(self, addr, reg, data):
+        if len(data) > I2C_BLOCK_MAX:
+            raise ValueError('block transfers are limited to %d bytes' % I2C_BLOCK_MAX)
+        self.__device(addr).write(reg, data)
+
+    def close(self):
+        pass
+
+
+def sim_board(latency=0.0, clock=time.monotonic, **mpu):
+    # the BeagleBone Blue sensor set: MPU9250 with its AK8963 behind the
+    # bypass mux, and a BMP280, all on one bus
+    bus = SimBus(latency=latency)
+    mpu = bus.attach(MPU_DEFAULT_I2C_ADDR, SimMPU9250(clock=clock, **mpu))
+    mpu.aux = bus.attach(AK8963_ADDR, SimAK8963(gate=mpu.bypass, clock=clock))
+    bus.attach(BMP280_ADDR, SimBMP280(clock=clock))
+
+    return bus
@@ -0,0 +1,32 @@
+import time
+
+__all__ = ['SimDevice']
+
+
+class SimDevice(object):
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.regs = bytearray(256)
+
+    def present(self):
+        return True
+
+    def update(self):
+        # bring the register file up to date with the device clock
+        pass
+
+    def read_reg(self, reg):
+        return self.regs[reg]
+
+    def write_reg(self, reg, val):
+        self.regs[reg] = val
+
+    def read(self, reg, n):
+        self.update()
+        return [self.read_reg((reg + i) & 0xFF) for i in range(n)]
+
+    def write(self, reg, data):
+        self.update()
+        for i, val in enumerate(data):
+            self.write_reg((reg + i) & 0xFF, val & 0xFF)
@@ -0,0 +1,176 @@
+from ..header import *
+from .device import *
+import time
+import numpy as np
+
+__all__ = ['SimMPU9250']
+
+# the chip does not answer while it comes out of a reset
+RESET_S = 0.001
+
+
+def _motion(t):
+    # a gently rocking board with gravity along z, in g and deg/s
+    w = 2.0 * np.pi * t
+    accel = np.stack([0.05 * np.sin(1.3 * w),
+                      0.05 * np.cos(0.7 * w),
+                      1.0 + 0.02 * np.sin(2.1 * w)], axis=1)
+    gyro = np.stack([20.0 * np.sin(0.5 * w),
+                     -15.0 * np.cos(0.3 * w),
+                     5.0 * np.sin(1.1 * w)], axis=1)
+    return accel, gyro
+
+
+class SimMPU9250(SimDevice):
+
+    def __init__(self, clock=time.monotonic, temp=25.0, aux=None, motion=_motion):
+        SimDevice.__init__(self, clock)
+        self._temp = temp
+        # sample times to accel in g and gyro in deg/s
+        self._motion = motion
+        # the device behind the auxiliary I2C master
+        self.aux = aux
+        self.reset()
+
+    def reset(self):
+        self.regs = bytearray(256)
+        self.regs[PWR_MGMT_1] = 0x01
+        self.regs[WHO_AM_I] = WHO_AM_I_MPU9250
+        self.fifo = bytearray()
+        self._status = 0
+        self._last_accel = None
+        self._k = 0
+        self._t = self._clock()
+        self._busy_until = self._t + RESET_S
+
+    def present(self):
+        return self._clock() >= self._busy_until
+
+    def bypass(self):
+        return (self.regs[INT_PIN_CFG] & BYPASS_EN) > 0
+
+    def rate(self):
+        return 1000.0 / (1 + self.regs[SMPLRT_DIV])
+
+    def sample(self, k):
+        # raw accel, temp and gyro words for sample indices k
+        accel, gyro = self._motion(k / self.rate())
+        accel_fsr = 2 << ((self.regs[ACCEL_CONFIG] >> 3) & 0x03)
+        gyro_fsr = 250 << ((self.regs[GYRO_CONFIG] >> 3) & 0x03)
+
+        raw = np.empty((len(k), 7), dtype=np.float64)
+        raw[:, 0:3] = accel * (32768.0 / accel_fsr)
+        raw[:, 3] = (self._temp - 21.0) * TEMP_SENSITIVITY
+        raw[:, 4:7] = gyro * (32768.0 / gyro_fsr)
+
+        return np.clip(np.rint(raw), -32768, 32767).astype('>i2')
+
+    def update(self):
+        rate = self.rate()
+        n = int((self._clock() - self._t) * rate)
+        if n <= 0:
+            return
+
+        # anything older than a full fifo can never be observed
+        m = min(n, FIFO_SIZE)
+        raw = self.sample(np.arange(self._k + n - m, self._k + n))
+        self._k += n
+        self._t += n / rate
+
+        self.regs[ACCEL_XOUT_H:GYRO_ZOUT_L + 1] = raw[-1].tobytes()
+        ext = self.__slave_read()
+        self._status |= RAW_DATA_RDY_INT
+        if (self.regs[ACCEL_INTEL_CTRL] & ACCEL_INTEL_EN) and (self.regs[INT_ENABLE] & BIT_MOT_INT_EN):
+            self.__wake_on_motion(raw[:, 0:3])
+
+        if (self.regs[USER_CTRL] & FIFO_EN_BIT) and self.regs[FIFO_EN]:
+            self.__fifo_push(raw, ext, n > m)
+
+    def __wake_on_motion(self, accel):
+        # any axis moving by more than the threshold from one sample to
+        # the next
+        fsr = 2 << ((self.regs[ACCEL_CONFIG] >> 3) & 0x03)
+        thr = self.regs[WOM_THR] * WOM_THR_MG * 32.768 / fsr
+        accel = accel.astype(np.int32)
+        if self._last_accel is not None:
+            accel = np.vstack([self._last_accel, accel])
+        if len(accel) > 1 and np.any(np.abs(np.diff(accel, axis=0)) > thr):
+            self._status |= WOM_INT
+        self._last_accel = accel[-1]
+
+    def __slave_read(self):
+        # the I2C master reads slave 0 once per sample, only the latest
+        # read of a batch is modelled, earlier frames repeat it
+        ctrl = self.regs[I2C_SLV0_CTRL]
+        addr = self.regs[I2C_SLV0_ADDR]
+        if not (self.regs[USER_CTRL] & I2C_MST_EN) or not (ctrl & I2C_SLV_EN) or \
+                not (addr & I2C_READ_FLAG) or self.aux is None:
+            return None
+
+        n = ctrl & 0x0F
+        ext = bytearray(self.aux.read(self.regs[I2C_SLV0_REG], n))
+        self.regs[EXT_SENS_DATA_00:EXT_SENS_DATA_00 + n] = ext
+        return ext
+
+    def __fifo_push(self, raw, ext, lost):
+        en = self.regs[FIFO_EN]
+        cols = []
+        if en & FIFO_ACCEL:
+            cols += [0, 1, 2]
+        if en & FIFO_TEMP_OUT:
+            cols += [3]
+        for bit, col in ((FIFO_GYRO_XOUT, 4), (FIFO_GYRO_YOUT, 5), (FIFO_GYRO_ZOUT, 6)):
+            if en & bit:
+                cols += [col]
+
+        data = raw[:, cols].tobytes()
+        if (en & FIFO_SLV0) and ext is not None:
+            frames = np.frombuffer(data, dtype=np.uint8).reshape(len(raw), -1)
+            tail = np.tile(np.frombuffer(bytes(ext), dtype=np.uint8), (len(raw), 1))
+            # a new measurement shows up in one frame only
+            tail[:-1, 0] &= 0xFF & ~MAG_DATA_READY
+            data = np.concatenate([frames, tail], axis=1).tobytes()
+        room = FIFO_SIZE - len(self.fifo)
+        if lost or len(data) > room:
+            self._status |= BIT_FIFO_OVERFLOW
+            if self.regs[CONFIG] & FIFO_MODE_KEEP_OLD:
+                data = data[:room]
+            else:
+                self.fifo += data
+                del self.fifo[:len(self.fifo) - FIFO_SIZE]
+                return
+
+        self.fifo += data
+
+    def read(self, reg, n):
+        if reg != FIFO_R_W:
+            return SimDevice.read(self, reg, n)
+
+        # FIFO_R_W does not auto-increment, every byte pops the fifo
+        self.update()
+        out = list(self.fifo[:n])
+        del self.fifo[:n]
+        return out + [0xFF] * (n - len(out))
+
+    def read_reg(self, reg):
+        if reg == INT_STATUS:
+            c = self._status
+            self._status = 0
+            return c
+        if reg == FIFO_COUNTH:
+            return len(self.fifo) >> 8
+        if reg == FIFO_COUNTL:
+            return len(self.fifo) & 0xFF
+
+        return self.regs[reg]
+
+    def write_reg(self, reg, val):
+        if reg == PWR_MGMT_1 and (val & H_RESET):
+            self.reset()
+            return
+        if reg == USER_CTRL and (val & BIT_FIFO_RST):
+            # self clearing
+            self.fifo = bytearray()
+            val &= ~BIT_FIFO_RST
+
+        self.regs[reg] = val
@@ -0,0 +1,9 @@
+from ..lazy import *
+
+__getattr__, __dir__, __all__ = lazy_loader(__name__, globals(), {
+    '.binlog': ['BinLogWriter', 'BinLogReader', 'log_channel', 'log_dtype',
+                'IMU6_CHANNELS', 'IMU10_CHANNELS', 'BARO_CHANNELS'],
+    '.csvlog': ['CsvLogWriter'],
+    '.rotate': ['RotatingLog', 'compress_file'],
+    '.net': ['StreamPublisher', 'StreamSubscriber', 'STREAM_PORT'],
+})
@@ -0,0 +1,157 @@
+import gzip
+import json
+import lzma
+import struct
+import time
+import numpy as np
+
+__all__ = ['BinLogWriter', 'BinLogReader', 'log_channel', 'log_dtype',
+           'IMU6_CHANNELS', 'IMU10_CHANNELS', 'BARO_CHANNELS']
+
+# file layout: magic, little endian u32 header length, JSON header, then
+# fixed size little endian records back to back
+BINLOG_MAGIC = b'BEAGLOG1'
+BINLOG_VERSION = 1
+
+
+def log_channel(name, dtype='<f4', scale=1.0, unit=''):
+    # a stored value times scale gives the value in unit
+    return {'name': name, 'dtype': np.dtype(dtype).str, 'scale': scale, 'unit': unit}
+
+
+def log_dtype(channels):
+    return np.dtype([(str(c['name']), c['dtype']) for c in channels])
+
+
+IMU6_CHANNELS = [log_channel('timestamp', '<f8', unit='s')] + \
+                [log_channel('imu_a' + a, unit='m/s^2') for a in 'xyz'] + \
+                [log_channel('imu_g' + a, unit='deg/s') for a in 'xyz']
+
+IMU10_CHANNELS = IMU6_CHANNELS[:1] + [log_channel('temp', unit='C')] + IMU6_CHANNELS[1:] + \
+                 [log_channel('imu_m' + a, unit='uT') for a in 'xyz']
+
+BARO_CHANNELS = [log_channel('timestamp', '<f8', unit='s'),
+                 log_channel('temp', unit='C'),
+                 log_channel('pressure', unit='hPa'),
+                 log_channel('altitude', unit='m')]
+
+
+class BinLogWriter(object):
+
+    def __init__(self, path, channels, sample_rate=None, calibration=None, meta=None, block_rows=4096):
+        self._channels = list(channels)
+        self._dtype = log_dtype(self._channels)
+        self._block = np.zeros(block_rows, dtype=self._dtype)
+        self._n = 0
+        self.rows = 0
+
+        header = {'version': BINLOG_VERSION,
+                  'created': time.time(),
+                  'channels': self._channels,
+                  'sample_rate': sample_rate,
+                  'calibration': calibration or {},
+                  'meta': meta or {}}
+        header = json.dumps(header).encode('utf-8')
+
+        self._f = open(path, 'wb')
+        self._f.write(BINLOG_MAGIC + struct.pack('<I', len(header)) + header)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def writerow(self, row):
+        self._block[self._n] = tuple(row)
+        self._n += 1
+        if self._n == len(self._block):
+            self.__flush_block()
+
+    def write(self, records):
+        # a structured array in the log dtype goes straight to the file
+        self.__flush_block()
+        records = np.ascontiguousarray(records, dtype=self._dtype)
+        self._f.write(memoryview(records).cast('B'))
+        self.rows += len(records)
+
+    def __flush_block(self):
+        if self._n > 0:
+            self._f.write(memoryview(self._block[:self._n]).cast('B'))
+            self.rows += self._n
+            self._n = 0
+
+    def flush(self):
+        self.__flush_block()
+        self._f.flush()
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def tell(self):
+        # bytes in the file once the pending block is written
+        return self._f.tell() + self._n * self._dtype.itemsize
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.flush()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinLogReader(object):
+
+    def __init__(self, path):
+        # finished segments of a rotating log may be compressed
+        if path.endswith('.gz'):
+            self._f = gzip.open(path, 'rb')
+        elif path.endswith('.xz'):
+            self._f = lzma.open(path, 'rb')
+        else:
+            self._f = open(path, 'rb')
+        magic = self._f.read(len(BINLOG_MAGIC))
+        if magic != BINLOG_MAGIC:
+            self._f.close()
+            raise ValueError('%s is not a beagle binary log' % path)
+        n, = struct.unpack('<I', self._f.read(4))
+        self.header = json.loads(self._f.read(n).decode('utf-8'))
+        self.channels = self.header['channels']
+        self.dtype = log_dtype(self.channels)
+
+    @property
+    def names(self):
+        return [c['name'] for c in self.channels]
+
+    def read(self, rows=-1):
+        # raw records, an incomplete trailing record is ignored
+        size = -1 if rows < 0 else rows * self.dtype.itemsize
+        buf = self._f.read(size)
+        n = len(buf) // self.dtype.itemsize
+        return np.frombuffer(buf, dtype=self.dtype, count=n)
+
+    def scaled(self, records):
+        # (N, channels) float64 array in channel units
+        out = np.empty((len(records), len(self.channels)), dtype=np.float64)
+        for i, c in enumerate(self.channels):
+            np.multiply(records[c['name']], c['scale'], out=out[:, i])
+        return out
+
+    def blocks(self, rows=65536):
+        while True:
+            records = self.read(rows)
+            if len(records) == 0:
+                return
+            yield records
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,47 @@
+import csv
+
+__all__ = ['CsvLogWriter']
+
+
+class CsvLogWriter(object):
+
+    # the same writer interface as BinLogWriter for plain text logs
+
+    def __init__(self, path, channels):
+        self._channels = list(channels)
+        self._f = open(path, 'w')
+        self._writer = csv.writer(self._f)
+        self._writer.writerow([c['name'] for c in self._channels])
+        # float32 channels with the 7 digits they hold, like bin2csv.py,
+        # not the false precision of their double value
+        self._fmt = ','.join('%.7g' if c['dtype'] == '<f4' else '%r' for c in self._channels) + '\r\n'
+        self.rows = 0
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def write(self, records):
+        fmt = self._fmt
+        self._f.write(''.join([fmt % row for row in records.tolist()]))
+        self.rows += len(records)
+
+    def flush(self):
+        self._f.flush()
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def tell(self):
+        return self._f.tell()
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,367 @@
+from .binlog import *
+import collections
+import json
+import socket
+import struct
+import threading
+import time
+import numpy as np
+
+__all__ = ['StreamPublisher', 'StreamSubscriber', 'STREAM_PORT']
+
+STREAM_PORT = 4950
+
+# every frame: magic, kind, sequence number of the data frame, index of
+# the first record since the publisher started, record count and payload
+# length, little endian. A header frame carries the channels as JSON and
+# the sequence number of the next data frame, a data frame the records
+# back to back in the log dtype.
+FRAME = struct.Struct('<4sB3xIQII')
+FRAME_MAGIC = b'BGS1'
+KIND_HEADER = 0
+KIND_DATA = 1
+
+# records per UDP datagram are kept under a typical MTU
+UDP_BYTES = 1400
+TCP_BYTES = 1 << 16
+
+
+def _sendall(sock, buffers):
+    # sendmsg without joining the buffers, it may stop part way on a
+    # stream socket
+    buffers = [memoryview(b).cast('B') for b in buffers]
+    while buffers:
+        n = sock.sendmsg(buffers)
+        while buffers and n >= len(buffers[0]):
+            n -= len(buffers[0])
+            buffers.pop(0)
+        if n:
+            buffers[0] = buffers[0][n:]
+
+
+class StreamPublisher(object):
+
+    # sends records to subscribers in batched binary frames. publish() only
+    # queues a block of records and returns, a thread does the sending, so
+    # a slow network or subscriber never holds up the acquisition: once
+    # queue_rows records are waiting, further blocks are dropped and
+    # counted, or with block=True publish() waits for room.
+    #
+    # With tcp the publisher listens on address and any number of
+    # subscribers connect, each gets the header first. With udp it sends
+    # to address and repeats the header every announce seconds, so a
+    # subscriber can join at any time. Records keep their index across
+    # drops, so a subscriber can tell how many it missed.
+    #
+    # As a Pipeline stage, the records of the stage before go out as they
+    # arrive.
+
+    def __init__(self, dtype, address=('', STREAM_PORT), proto='tcp', channels=None, meta=None,
+                 queue_rows=65536, frame_bytes=None, announce=1.0, send_timeout=2.0):
+        if proto not in ('tcp', 'udp'):
+            raise ValueError('proto must be tcp or udp')
+        self._dtype = np.dtype(dtype)
+        if channels is None:
+            channels = [log_channel(n, self._dtype[n].str) for n in self._dtype.names]
+        header = json.dumps({'channels': channels, 'meta': meta or {}}).encode('utf-8')
+        self._header = header
+
+        self._proto = proto
+        self._rows = max(1, (frame_bytes or (UDP_BYTES if proto == 'udp' else TCP_BYTES)) // self._dtype.itemsize)
+        self._announce = announce
+        self._send_timeout = send_timeout
+        self._queue_rows = queue_rows
+
+        self._pending = collections.deque()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._closing = False
+
+        self._seq = 0
+        self._index = 0
+        self._clients = []
+        if proto == 'tcp':
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._sock.bind(address)
+            self._sock.listen(4)
+            self._sock.setblocking(False)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.connect(address)
+        self.address = self._sock.getsockname() if proto == 'tcp' else address
+
+        self.published = 0
+        self.dropped = 0
+        self.sent = 0
+        self.frames = 0
+        self.errors = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self.__run, name='beagle-publisher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    @property
+    def queued(self):
+        return self._queued
+
+    def publish(self, records, block=False, timeout=None, copy=True):
+        # returns the number of records queued, 0 when the block was dropped.
+        # A block larger than the whole queue is dropped without waiting,
+        # there would never be room for it
+        n = len(records)
+        if n == 0:
+            return 0
+        with self._cond:
+            if block and n <= self._queue_rows:
+                self._cond.wait_for(lambda: self._queued + n <= self._queue_rows or self._closing, timeout)
+            first = self._index
+            self._index += n
+            self.published += n
+            if self._closing or self._queued + n > self._queue_rows:
+                self.dropped += n
+                return 0
+            # a copy, the caller may reuse its buffer
+            if copy:
+                records = np.array(records, dtype=self._dtype)
+            self._pending.append((first, records))
+            self._queued += n
+            self._cond.notify_all()
+        return n
+
+    def process(self, records):
+        # passes the records on, so a log stage can follow in a Pipeline
+        records = np.array(records, dtype=self._dtype)
+        self.publish(records, copy=False)
+        return records
+
+    def __frame(self, kind, first, n, payload):
+        head = FRAME.pack(FRAME_MAGIC, kind, self._seq & 0xFFFFFFFF, first, n, len(payload))
+        if kind == KIND_DATA:
+            self._seq += 1
+        return head, payload
+
+    def __accept(self):
+        while True:
+            try:
+                conn, addr = self._sock.accept()
+            except (BlockingIOError, socket.timeout):
+                return
+            conn.settimeout(self._send_timeout)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                _sendall(conn, self.__frame(KIND_HEADER, self._index, 0, self._header))
+            except (IOError, OSError):
+                conn.close()
+                continue
+            self._clients.append(conn)
+
+    def __send(self, buffers):
+        if self._proto == 'udp':
+            try:
+                self._sock.sendmsg(buffers)
+            except (IOError, OSError) as e:
+                # nobody listening yet, the datagram is gone
+                self.errors += 1
+                self.last_error = e
+            return
+
+        # a subscriber that cannot keep up within send_timeout is dropped
+        for conn in list(self._clients):
+            try:
+                _sendall(conn, buffers)
+            except (IOError, OSError) as e:
+                self.errors += 1
+                self.last_error = e
+                self._clients.remove(conn)
+                conn.close()
+
+    def __run(self):
+        next_announce = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing, 0.1)
+                item = self._pending.popleft() if self._pending else None
+                if item is None and self._closing:
+                    break
+
+            if self._proto == 'tcp':
+                self.__accept()
+            elif time.monotonic() >= next_announce:
+                next_announce = time.monotonic() + self._announce
+                self.__send(self.__frame(KIND_HEADER, self._index, 0, self._header))
+            if item is None:
+                continue
+
+            first, records = item
+            for i in range(0, len(records), self._rows):
+                chunk = records[i:i + self._rows]
+                self.__send(self.__frame(KIND_DATA, first + i, len(chunk), memoryview(chunk).cast('B')))
+                self.frames += 1
+            self.sent += len(records)
+
+            with self._cond:
+                self._queued -= len(records)
+                self._cond.notify_all()
+
+    def close(self):
+        # what is queued still goes out
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        for conn in self._clients:
+            conn.close()
+        self._clients = []
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamSubscriber(object):
+
+    # the other end of a StreamPublisher. read() returns the records of one
+    # frame. Records missing between frames, dropped by the publisher or
+    # lost on the way, are counted in lost, out of order UDP frames are
+    # passed on, counted in reordered and taken off lost again.
+
+    def __init__(self, address=('127.0.0.1', STREAM_PORT), proto='tcp', timeout=5.0):
+        if proto not in ('tcp', 'udp'):
+            raise ValueError('proto must be tcp or udp')
+        self._proto = proto
+        if proto == 'tcp':
+            self._sock = socket.create_connection(address, timeout)
+            self._rbuf = bytearray()
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            self._sock.bind(address)
+            self._buf = bytearray(1 << 16)
+
+        self.channels = None
+        self.meta = None
+        self.dtype = None
+        self._next = None
+        self._seq = None
+
+        self.frames = 0
+        self.records = 0
+        self.lost = 0
+        self.lost_frames = 0
+        self.reordered = 0
+
+    def __recv(self, timeout):
+        # one frame as (kind, seq, first, n, payload), None on timeout
+        if self._proto == 'udp':
+            self._sock.settimeout(timeout)
+            try:
+                size = self._sock.recv_into(self._buf)
+            except socket.timeout:
+                return None
+            if size < FRAME.size:
+                return None
+            magic, kind, seq, first, n, length = FRAME.unpack_from(self._buf)
+            if magic != FRAME_MAGIC or size < FRAME.size + length:
+                return None
+            return kind, seq, first, n, bytes(self._buf[FRAME.size:FRAME.size + length])
+
+        # a frame cut short by the timeout stays buffered for the next call
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self.__fill(FRAME.size, deadline):
+            return None
+        magic, kind, seq, first, n, length = FRAME.unpack_from(self._rbuf)
+        if magic != FRAME_MAGIC:
+            raise ValueError('not a beagle stream')
+        if not self.__fill(FRAME.size + length, deadline):
+            return None
+        payload = bytes(self._rbuf[FRAME.size:FRAME.size + length])
+        del self._rbuf[:FRAME.size + length]
+        return kind, seq, first, n, payload
+
+    def __fill(self, size, deadline):
+        while len(self._rbuf) < size:
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+            self._sock.settimeout(None if deadline is None else left)
+            try:
+                chunk = self._sock.recv(1 << 16)
+            except socket.timeout:
+                return False
+            if not chunk:
+                raise EOFError('the publisher closed the stream')
+            self._rbuf += chunk
+        return True
+
+    def read(self, timeout=None):
+        # the records of the next data frame, empty on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            frame = self.__recv(left)
+            if frame is None:
+                return np.zeros(0, dtype=self.dtype) if self.dtype is not None else None
+
+            kind, seq, first, n, payload = frame
+            if kind == KIND_HEADER:
+                if self.dtype is None:
+                    header = json.loads(payload.decode('utf-8'))
+                    self.channels = header['channels']
+                    self.meta = header['meta']
+                    self.dtype = log_dtype(self.channels)
+                continue
+            if self.dtype is None:
+                # udp data before the first header
+                continue
+
+            if self._seq is not None and seq < self._seq:
+                # a late UDP frame, its records were counted as lost when
+                # the frame after it arrived
+                self.reordered += 1
+                self.lost_frames -= 1
+                self.lost -= n
+            else:
+                if self._seq is not None and seq > self._seq + 1:
+                    self.lost_frames += seq - self._seq - 1
+                if self._next is not None and first > self._next:
+                    self.lost += first - self._next
+                self._seq = seq
+                self._next = max(first + n, self._next or 0)
+
+            self.frames += 1
+            self.records += n
+            return np.frombuffer(payload, dtype=self.dtype, count=n)
+
+    def batches(self, timeout=None):
+        # frames until the publisher goes away
+        while True:
+            try:
+                records = self.read(timeout)
+            except EOFError:
+                return
+            if records is not None and len(records):
+                yield records
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
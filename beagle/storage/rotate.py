@@ -0,0 +1,150 @@
+import gzip
+import lzma
+import os
+import queue
+import shutil
+import threading
+import time
+
+__all__ = ['RotatingLog', 'compress_file']
+
+COMPRESSORS = {
+    'gzip': ('.gz', lambda path, level: gzip.open(path, 'wb', compresslevel=level or 6)),
+    'xz': ('.xz', lambda path, level: lzma.open(path, 'wb', preset=level if level is not None else 6)),
+}
+
+
+def compress_file(path, method='gzip', level=None):
+    # writes path + .gz/.xz next to it and removes the original once the
+    # compressed copy is on disk
+    suffix, opener = COMPRESSORS[method]
+    out = path + suffix
+    with open(path, 'rb') as src, opener(out + '.tmp', level) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    with open(out + '.tmp', 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(out + '.tmp', out)
+    os.remove(path)
+    return out
+
+
+class RotatingLog(object):
+
+    # a log split into segments <prefix>_000<suffix>, <prefix>_001<suffix>,
+    # ... by size or age. opener(path) makes the writer for one segment,
+    # BinLogWriter or CsvLogWriter, so every segment is a complete log of
+    # its own. The data is flushed and fsynced every sync_interval seconds,
+    # so a power cut loses at most that much. Finished segments go to a
+    # background thread for compression, writing never waits for it.
+
+    def __init__(self, prefix, suffix, opener, max_bytes=64 << 20, max_seconds=None,
+                 sync_interval=1.0, compress='gzip', level=None):
+        if compress is not None and compress not in COMPRESSORS:
+            raise ValueError('unknown compression %r' % compress)
+
+        self._prefix = prefix
+        self._suffix = suffix
+        self._opener = opener
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.sync_interval = sync_interval
+        self._compress = compress
+        self._level = level
+
+        self._index = 0
+        self._writer = None
+        self.segments = []
+        self.errors = 0
+        self.last_error = None
+
+        self._jobs = queue.Queue()
+        self._worker = None
+        if compress is not None:
+            self._worker = threading.Thread(target=self.__work, name='beagle-compress')
+            self._worker.daemon = True
+            self._worker.start()
+
+        self.__open()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def pending(self):
+        return self._jobs.qsize()
+
+    def __open(self):
+        self._path = '%s_%03d%s' % (self._prefix, self._index, self._suffix)
+        self._index += 1
+        self._writer = self._opener(self._path)
+        self._opened = time.monotonic()
+        self._next_sync = self._opened + self.sync_interval
+
+    def __finish(self):
+        self._writer.close()
+        if self._worker is not None:
+            self._jobs.put(self._path)
+        else:
+            self.segments.append(self._path)
+
+    def __work(self):
+        while True:
+            path = self._jobs.get()
+            if path is None:
+                return
+            try:
+                self.segments.append(compress_file(path, self._compress, self._level))
+            except (IOError, OSError) as e:
+                # the uncompressed segment stays
+                self.errors += 1
+                self.last_error = e
+                self.segments.append(path)
+
+    def __tick(self):
+        # size and age are only looked at when a sync is due, asking a
+        # text file for its size flushes it
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+
+        self.sync()
+        if (self.max_bytes and self._writer.tell() >= self.max_bytes) or \
+                (self.max_seconds and now - self._opened >= self.max_seconds):
+            self.rotate()
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self.__tick()
+
+    def write(self, records):
+        self._writer.write(records)
+        self.__tick()
+
+    def sync(self):
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._next_sync = time.monotonic() + self.sync_interval
+
+    def rotate(self):
+        self.__finish()
+        self.__open()
+
+    def close(self, wait=True):
+        # wait for the compression of every segment, or leave the rest of
+        # the queue to the daemon thread
+        if self._writer is None:
+            return
+        self.sync()
+        self.__finish()
+        self._writer = None
+        if self._worker is not None:
+            self._jobs.put(None)
+            if wait:
+                self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
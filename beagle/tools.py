@@ -1,10 +1,47 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
 
-__all__ = ['get_datetime']
+__all__ = ['get_datetime', 'TimeFormatter', 'poll_until']
 
 
 def get_datetime(utc0_time, delta=28800):
-    d = datetime.fromtimestamp(utc0_time) + timedelta(seconds=int(delta))
-    utc8 = datetime.fromtimestamp(time.mktime(d.timetuple()))
-    return utc8
+    # whole seconds, like the mktime round trip this used to take
+    return datetime.fromtimestamp(int(utc0_time) + int(delta))
+
+
+class TimeFormatter(object):
+
+    # strftime of get_datetime(t, delta), local time moved by delta. The
+    # string for the current second is kept so a formatter called for
+    # every row costs one comparison
+
+    def __init__(self, fmt='%Y-%m-%d_%H%M%S', delta=28800, millis=False):
+        self._fmt = fmt
+        self._delta = int(delta)
+        self._millis = millis
+        self._sec = None
+        self._text = None
+
+    def __call__(self, t):
+        sec = int(t // 1)
+        if sec != self._sec:
+            self._sec = sec
+            self._text = time.strftime(self._fmt, time.localtime(sec + self._delta))
+        if self._millis:
+            return '%s.%03d' % (self._text, int((t - sec) * 1000))
+        return self._text
+
+
+def poll_until(cond, timeout, interval=0.001):
+    # call cond() until it returns true or the timeout runs out, bus errors
+    # from a device that is still coming up count as not ready
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if cond():
+                return True
+        except IOError:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
@@ -0,0 +1,202 @@
+import beagle as bg
+import beagle.sim
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+IMPORT_CASES = [
+    ('import beagle', 'import beagle; beagle.get_datetime(0)'),
+    ('import beagle, MPU', 'import beagle; beagle.MPU'),
+]
+
+
+def read_paths(mpu, bmp, fifo_interval):
+    # every path returns the number of samples it produced
+
+    def one(read):
+        def fn():
+            read()
+            return 1
+        return fn
+
+    def fifo():
+        time.sleep(fifo_interval)
+        return len(mpu.mpu_read_fifo()['accel'])
+
+    def ahrs(f):
+        # filter cost alone, on a fixed batch of fifo sized chunks
+        batch = {'accel': np.tile([0.0, 0.0, 9.81], (100, 1)),
+                 'gyro': np.tile([1.0, -2.0, 0.5], (100, 1)),
+                 'mag': np.tile([20.0, 5.0, -40.0], (100, 1))}
+
+        def fn():
+            f.process(batch)
+            return 100
+        return fn
+
+    rate = mpu.mpu_scales()['sample_rate']
+    return [
+        ('mpu_read_accel', None, one(mpu.mpu_read_accel)),
+        ('mpu_read_gyro', None, one(mpu.mpu_read_gyro)),
+        ('mpu_read_temp', None, one(mpu.mpu_read_temp)),
+        ('mpu_read_mag', None, one(mpu.mpu_read_mag)),
+        ('mpu_read_motion', None, one(mpu.mpu_read_motion)),
+        ('mpu_read_motion+mag', None, one(lambda: mpu.mpu_read_motion(mag=True))),
+        ('mpu_read_motion_raw', None, one(mpu.mpu_read_motion_raw)),
+        ('mpu_read_fifo', mpu.mpu_fifo_start, fifo),
+        ('bmp_read', None, one(bmp.bmp_read)),
+        ('bmp_read_raw', None, one(bmp.bmp_read_raw)),
+        ('madgwick', None, ahrs(bg.Madgwick(rate))),
+        ('mahony', None, ahrs(bg.Mahony(rate))),
+    ]
+
+
+def check_decimator():
+    # output timestamps strictly increase from the first input record and
+    # the output does not depend on how the input is split into blocks
+    dtype = bg.log_dtype(bg.IMU6_CHANNELS + [bg.log_channel('mag_new', '<u1')])
+    records = np.zeros(1000, dtype=dtype)
+    records['timestamp'] = 100.0 + np.arange(1000) / 500.0
+    records['imu_ax'] = 4.83 + np.sin(np.arange(1000) / 7.0)
+    records['mag_new'][::5] = 1
+    for kind in ('fir', 'iir'):
+        for factor in (1, 4, 5):
+            whole = bg.Decimator(dtype, factor, kind).process(records)
+            ts = whole['timestamp']
+            if ts[0] != records['timestamp'][0] or np.any(np.diff(ts) <= 0):
+                return '%s/%d: timestamps %s' % (kind, factor, ts[:4])
+            for rows in (1, 3, 64, 333):
+                d = bg.Decimator(dtype, factor, kind)
+                out = np.concatenate([d.process(records[i:i + rows]) for i in range(0, len(records), rows)])
+                if not np.array_equal(out, whole):
+                    return '%s/%d: differs in blocks of %d rows' % (kind, factor, rows)
+    return None
+
+
+def check_array_mag():
+    # with the magnetometer in bypass, rows between AK8963 measurements
+    # hold the last one and never come out as zeros
+    bus = bg.sim.sim_board()
+    mpu = bg.MPU(bus=bus, sample_rate=1000)
+    array = bg.SensorArray([('a', mpu)], 500, mag=True)
+    with array:
+        rows = np.array([array.read() for i in range(500)], dtype=array.dtype)
+    fresh = np.flatnonzero(rows['a_mag_new'])
+    if len(fresh) == 0:
+        return 'no magnetometer readings'
+    rows = rows[fresh[0]:]
+    zero = (rows['a_mx'] == 0) & (rows['a_my'] == 0) & (rows['a_mz'] == 0)
+    if np.any(zero):
+        return '%d of %d rows with a zero field' % (np.count_nonzero(zero), len(rows))
+    if rows['a_mag_new'].mean() > 0.3:
+        return 'magnetometer new on %.0f %% of the rows at 500 Hz' % (rows['a_mag_new'].mean() * 100)
+    return None
+
+
+CHECKS = [
+    ('decimator', check_decimator),
+    ('array magnetometer', check_array_mag),
+]
+
+
+def import_time(stmt, runs=3):
+    # best of a few fresh interpreters, also reports whether numpy came along
+    code = ('import sys, time\nt = time.perf_counter()\n%s\n'
+            'print(time.perf_counter() - t, "numpy" in sys.modules)' % stmt)
+    best = None
+    for i in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+        if best is None or float(out[0]) < best[0]:
+            best = (float(out[0]), out[1] == 'True')
+    return best
+
+
+def run_path(bus, fn, seconds):
+    samples = 0
+    calls = 0
+    txn = bus.transactions
+    t0 = time.monotonic()
+    c0 = time.process_time()
+    while time.monotonic() - t0 < seconds:
+        samples += fn()
+        calls += 1
+    wall = time.monotonic() - t0
+    cpu = time.process_time() - c0
+    txn = bus.transactions - txn
+
+    # allocation peak of a short second run
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(min(calls, 100)):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    samples = max(samples, 1)
+    return {'rate': samples / wall,
+            'cpu_us': cpu / samples * 1e6,
+            'txn': txn / float(samples),
+            'peak_kib': peak / 1024.0}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the sensor read paths on a simulated board')
+    parser.add_argument('paths', nargs='*', help='only run these read paths')
+    parser.add_argument('-s', '--seconds', type=float, default=1.0, help='run time per path')
+    parser.add_argument('-l', '--latency', type=float, default=0.0, help='bus latency per transaction in us')
+    parser.add_argument('-r', '--rate', type=int, default=1000, help='MPU sample rate in Hz')
+    parser.add_argument('-m', '--mag-master', action='store_true',
+                        help='read the magnetometer through the MPU I2C master')
+    parser.add_argument('--stats', action='store_true', help='time every bus transaction')
+    parser.add_argument('--import-budget', type=float, default=50.0,
+                        help='fail when a bare "import beagle" takes longer, in ms')
+
+    args = parser.parse_args()
+
+    print('%-22s %12s %12s' % ('import', 'ms', 'numpy'))
+    for name, stmt in IMPORT_CASES:
+        t, numpy = import_time(stmt)
+        print('%-22s %12.1f %12s' % (name, t * 1e3, 'yes' if numpy else 'no'))
+        if name == 'import beagle' and (t * 1e3 > args.import_budget or numpy):
+            sys.exit('"import beagle" took %.1f ms%s, the budget is %.0f ms without numpy'
+                     % (t * 1e3, ' and loaded numpy' if numpy else '', args.import_budget))
+    print('')
+
+    # the benchmarked paths have to give the right answer first
+    for name, fn in CHECKS:
+        error = fn()
+        print('%-22s %12s' % (name, 'ok' if error is None else 'failed'))
+        if error is not None:
+            sys.exit('check %s failed: %s' % (name, error))
+    print('')
+
+    bus = bg.sim.sim_board(latency=args.latency / 1e6)
+    stats = bg.SensorStats() if args.stats else None
+    mpu = bg.MPU(bus=bus, sample_rate=args.rate, mag_master=args.mag_master, stats=stats)
+    bmp = bg.BMP(bus=bus, stats=stats)
+
+    print('latency %.0f us/transaction, MPU at %d Hz, CPU includes the simulated devices'
+          % (args.latency, args.rate))
+    print('%-22s %12s %12s %10s %10s' % ('path', 'samples/s', 'CPU us/smp', 'txn/smp', 'peak KiB'))
+
+    for name, setup, fn in read_paths(mpu, bmp, 0.02):
+        if args.paths and name not in args.paths:
+            continue
+        try:
+            if setup is not None:
+                setup()
+            r = run_path(bus, fn, args.seconds)
+        except Exception as e:
+            print('%-22s failed: %r' % (name, e))
+            continue
+        print('%-22s %12.0f %12.1f %10.2f %10.1f' % (name, r['rate'], r['cpu_us'], r['txn'], r['peak_kib']))
+
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import beagle as bg
+import argparse
+import numpy as np
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Convert a beagle binary log to CSV')
+    parser.add_argument('log', help='binary log file, .gz and .xz are read too')
+    parser.add_argument('-o', '--output', help='CSV file, defaults to the log name with .csv')
+
+    args = parser.parse_args()
+    # rotated segments may be compressed, log_000.blog.gz gives log_000.csv
+    name = args.log
+    for ext in ('.gz', '.xz', '.blog'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    out = args.output or name + '.csv'
+
+    with bg.BinLogReader(args.log) as reader, open(out, 'w') as f:
+        # a raw capture is decoded into the rows it would have had
+        raw = reader.header['meta'].get('raw')
+        channels = reader.channels
+        if raw is not None:
+            decoder = bg.CaptureDecoder(raw, 'mag' in reader.names, 'baro' in reader.names)
+            channels = decoder.channels
+
+        # doubles keep full precision, everything else was stored as
+        # float32 or a raw integer so 7 significant digits are exact
+        fmt = ['%.6f' if c['dtype'] == '<f8' else '%.7g' for c in channels]
+        f.write(','.join(c['name'] for c in channels) + '\n')
+        rows = 0
+        for records in reader.blocks():
+            if raw is not None:
+                records = decoder.process(records)
+                np.savetxt(f, records.tolist(), fmt=fmt, delimiter=',')
+            else:
+                np.savetxt(f, reader.scaled(records), fmt=fmt, delimiter=',')
+            rows += len(records)
+
+    print('%d rows written to "%s".' % (rows, out))
+
+    return 0
+
+
+if __name__ == '__main__':
+    main()
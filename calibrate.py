@@ -0,0 +1,59 @@
+import beagle as bg
+import argparse
+import time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Calibrate the BeagleBone Blue IMU')
+    parser.add_argument('-t', '--time', help='seconds to collect', type=float, default=60.0)
+    parser.add_argument('-r', '--rate', help='samples per second', type=int, default=200)
+    parser.add_argument('--reset', help='forget the data collected by earlier runs', action='store_true')
+
+    args = parser.parse_args()
+
+    cache = bg.CalibrationCache()
+    mpu = bg.MPU(sample_rate=args.rate, cache=cache, mag_master=True)
+    previous = mpu.mpu_calibration()
+    key = bg.chip_key('mpu9250-calstate', bg.header.IMU_BUS, bg.header.MPU_DEFAULT_I2C_ADDR)
+
+    # the fit accumulators are tiny, so each run carries on from the last
+    if args.reset:
+        cache.clear(key)
+        previous = None
+    calibrator = bg.Calibrator(state=cache.get(key))
+
+    print('Hold the board still in different orientations, then turn it around every axis.')
+    mpu.mpu_set_calibration(None, save=False)
+    mpu.mpu_fifo_start()
+    try:
+        t0 = time.monotonic()
+        last = t0
+        while time.monotonic() - t0 < args.time:
+            time.sleep(0.1)
+            calibrator.add(mpu.mpu_read_fifo())
+            if time.monotonic() - last >= 1.0:
+                last = time.monotonic()
+                counts = calibrator.counts
+                print('still samples %6d, orientations %3d, magnetometer samples %6d'
+                      % (counts['gyro'], counts['accel'], counts['mag']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mpu.mpu_fifo_stop()
+
+    cache.put(key, calibrator.state())
+    cal = calibrator.result(previous)
+    mpu.mpu_set_calibration(cal)
+
+    print('gyro bias     %s deg/s' % cal.gyro_bias.round(4).tolist())
+    print('accel offset  %s m/s^2' % cal.accel_offset.round(4).tolist())
+    print('accel scale   %s' % cal.accel_scale.round(4).tolist())
+    print('mag offset    %s uT' % cal.mag_offset.round(3).tolist())
+    print('Saved to "%s".' % cache.path)
+
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,110 @@
 import beagle as bg
 import argparse
-import sys
 import time
-import csv
+import numpy as np
+
+
+def open_log(name, args, channels, mpu, meta=None):
+    # a rotating log, write(records) takes a block of rows as a
+    # structured array
+    decimate = args['decimate']
+    if args['format'] == 'bin':
+        scales = mpu.mpu_scales()
+        meta = dict(meta or {}, decimate=decimate)
+
+        def opener(path):
+            return bg.BinLogWriter(path, channels, sample_rate=scales['sample_rate'] / decimate,
+                                   calibration=scales, meta=meta)
+        suffix = '.blog'
+    else:
+        def opener(path):
+            return bg.CsvLogWriter(path, channels)
+        suffix = '.csv'
+
+    compress = None if args['compress'] == 'none' else args['compress']
+    max_seconds = args['segment_minutes'] * 60 if args['segment_minutes'] else None
+    return bg.RotatingLog(name, suffix, opener, max_bytes=args['segment_mb'] << 20,
+                          max_seconds=max_seconds, compress=compress)
+
+
+def collector_source(rate, axis_10, baro, retries=0):
+    # runs in the collector process of a pipeline
+    cache = bg.CalibrationCache()
+    specs = [(bg.MPU, {'sample_rate': rate, 'cache': cache, 'retries': retries})]
+    if baro:
+        specs += [(bg.BMP, {'retries': retries})]
+    sensors = bg.open_sensors(*specs)
+    bmp = sensors[1] if baro else None
+    reader = bg.MultiRateReader(sensors[0], bmp, rate, temp=axis_10, mag=axis_10,
+                                ready=sensors[0].mpu_data_ready)
+    return reader.source()
+
+
+def event_options(args, mpu=None):
+    # only the rows around motion are logged, the threshold is in mg for
+    # the MPU's wake-on-motion and for the host side detector alike
+    rate = args['rate'] / float(args['decimate'])
+    if args['wom']:
+        mpu.mpu_set_motion_interrupt(args['trigger'])
+        trigger = bg.WakeOnMotion(mpu)
+    else:
+        trigger = bg.MotionDetector(args['trigger'] * bg.header.GRAVITY / 1000.0)
+    return {'trigger': trigger, 'pre': int(args['pre'] * rate), 'post': int(args['post'] * rate)}
+
+
+def publish_options(args, meta=None):
+    # -P host:port, the host to listen on for tcp, to send to for udp
+    host, _, port = args['publish'].rpartition(':')
+    return {'address': (host, int(port or bg.STREAM_PORT)), 'proto': 'udp' if args['udp'] else 'tcp',
+            'channels': bg.multirate_channels(args['10'], args['10'], args['baro']) if not args['raw'] else None,
+            'meta': dict(meta or {}, rate=args['rate'] / float(args['decimate']))}
+
+
+def run_pipeline(args):
+    # sensors, filtering and the log each in a process of their own
+    axis_10 = args['10']
+    decimate = args['decimate']
+    stamp = bg.TimeFormatter('%Y-%m-%d_%H%M%S')
+    st = stamp(time.time())
+
+    stages = []
+    if decimate > 1:
+        stages += [(bg.Decimator, {'factor': decimate})]
+    if args['trigger']:
+        stages += [(bg.EventRecorder, event_options(args))]
+    if args['publish']:
+        stages += [(bg.StreamPublisher, publish_options(args))]
+    compress = None if args['compress'] == 'none' else args['compress']
+    stages += [(bg.LogStage, {'prefix': st, 'fmt': args['format'],
+                              'channels': bg.multirate_channels(axis_10, axis_10, args['baro']),
+                              'sample_rate': args['rate'] / float(decimate),
+                              'meta': {'decimate': decimate},
+                              'max_bytes': args['segment_mb'] << 20,
+                              'max_seconds': args['segment_minutes'] * 60 if args['segment_minutes'] else None,
+                              'compress': compress})]
+
+    pipeline = bg.Pipeline((collector_source, {'rate': args['rate'], 'axis_10': axis_10, 'baro': args['baro'],
+                                               'retries': args['retries']}),
+                           stages)
+    try:
+        pipeline.start()
+    except IOError as e:
+        print('Building the log failed: %s' % e)
+        return 1
+
+    print('[%s] Start reading sensor data...' % st)
+    try:
+        while pipeline.running():
+            time.sleep(args['stats'] or 10.0)
+            print('[%s] backlog %s, dropped %s, read errors %d.'
+                  % (stamp(time.time()), pipeline.backlog, pipeline.overruns, pipeline.errors))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+
+    print('[%s] "%s_*" was saved.' % (stamp(time.time()), st))
+    return 0
 
 
 def main():
@@ -10,70 +112,143 @@ def main():
     parser = argparse.ArgumentParser(description='Collect data from BeagleBone Blue')
     parser.add_argument('-6', help='6 Axis', action='store_true')
     parser.add_argument('-10', help='10 Axis', action='store_true')
+    parser.add_argument('-b', '--baro', help='add the barometer', action='store_true')
+    parser.add_argument('-r', '--rate', help='rows per second', type=int, default=200)
+    parser.add_argument('-f', '--format', help='log format', choices=['bin', 'csv'], default='bin')
+    parser.add_argument('-d', '--decimate', help='low pass and keep every Nth row', type=int, default=1)
+    parser.add_argument('--segment-mb', help='start a new log file after this many MiB', type=int, default=64)
+    parser.add_argument('--segment-minutes', help='start a new log file after this many minutes', type=float)
+    parser.add_argument('-z', '--compress', help='compress finished log files',
+                        choices=['gzip', 'xz', 'none'], default='gzip')
+    parser.add_argument('-s', '--stats', help='print bus and timing statistics every this many seconds',
+                        type=float, default=0)
+    parser.add_argument('-p', '--pipeline', help='run sensors, filtering and logging in separate processes',
+                        action='store_true')
+    parser.add_argument('--raw', help='log the undecoded register bytes, bin2csv decodes them',
+                        action='store_true')
+    parser.add_argument('-t', '--trigger', help='only log around motion above this many mg', type=float)
+    parser.add_argument('--wom', help='detect motion with the MPU wake-on-motion interrupt', action='store_true')
+    parser.add_argument('--pre', help='seconds logged before motion', type=float, default=1.0)
+    parser.add_argument('--post', help='seconds logged after motion', type=float, default=2.0)
+    parser.add_argument('-P', '--publish', help='also stream the rows, listening on [host]:port, '
+                                              'or sending to host:port with --udp')
+    parser.add_argument('--udp', help='stream over UDP instead of TCP', action='store_true')
+    parser.add_argument('--retries', help='retry a failed bus transaction this many times', type=int, default=0)
+    parser.add_argument('--max-errors', help='give up after this many failed reads in a row',
+                        type=int, default=100)
 
     args = vars(parser.parse_args())
     axis_10 = args['10']
+    if args['raw'] and (args['format'] != 'bin' or args['decimate'] > 1 or args['pipeline']):
+        parser.error('--raw only goes with the binary format, without -d and -p')
+    if args['wom'] and (not args['trigger'] or args['pipeline']):
+        parser.error('--wom needs -t and does not go with -p')
+    if args['raw'] and args['trigger'] and not args['wom']:
+        parser.error('--raw only triggers with --wom')
+    if args['pipeline']:
+        return run_pipeline(args)
+
+    # bring the sensors up side by side, with a saved calibration applied
+    # bus transactions are only timed with --stats
+    cache = bg.CalibrationCache()
+    stats = bg.SensorStats() if args['stats'] > 0 else None
+    specs = [(bg.MPU, {'sample_rate': args['rate'], 'cache': cache, 'stats': stats, 'retries': args['retries']})]
+    if args['baro']:
+        specs += [(bg.BMP, {'stats': stats, 'retries': args['retries']})]
+    sensors = bg.open_sensors(*specs)
+    mpu = sensors[0]
+    bmp = sensors[1] if args['baro'] else None
 
-    mpu = bg.MPU()
+    # the magnetometer and barometer are only read at their own data rates
+    if args['raw']:
+        reader = bg.RawCapture(mpu, bmp, args['rate'], temp=axis_10, mag=axis_10,
+                               ready=mpu.mpu_data_ready, stats=stats)
+    else:
+        reader = bg.MultiRateReader(mpu, bmp, args['rate'], temp=axis_10, mag=axis_10,
+                                    ready=mpu.mpu_data_ready, stats=stats)
+    sched = reader.scheduler
+    decimator = bg.Decimator(reader.dtype, args['decimate']) if args['decimate'] > 1 else None
+    events = bg.EventRecorder(reader.dtype, **event_options(args, mpu)) if args['trigger'] else None
+    publisher = None
+    if args['publish']:
+        publisher = bg.StreamPublisher(reader.dtype, **publish_options(args, reader.meta() if args['raw'] else None))
+    block_rows = max(args['rate'] // 10, args['decimate'])
 
+    stamp = bg.TimeFormatter('%Y-%m-%d_%H%M%S')
     try:
         ts = time.time()
-        st = bg.get_datetime(ts).strftime('%Y-%m-%d_%H%M%S')
-        start_st = st
+        st = stamp(ts)
         print('[%s] Start reading sensor data...' % st)
 
-        with open(st + '.csv', 'w') as f:
-            writer = csv.writer(f)
-            if axis_10:
-                writer.writerow(['timestamp', 'temp',
-                                 'imu_ax', 'imu_ay', 'imu_az',
-                                 'imu_gx', 'imu_gy', 'imu_gz',
-                                 'imu_mx', 'imu_my', 'imu_mz'])
-            else:
-                writer.writerow(['timestamp',
-                                 'imu_ax', 'imu_ay', 'imu_az',
-                                 'imu_gx', 'imu_gy', 'imu_gz'])
-            data_rows = 0
-            while True:
-                try:
-                    ts = time.time()
-                    accel = mpu.mpu_read_accel()
-                    gyro = mpu.mpu_read_gyro()
+        log = open_log(st, args, reader.channels, mpu, reader.meta() if args['raw'] else None)
 
-                    row = [ts]
-                    if axis_10:
-                        temp = mpu.mpu_read_temp()
-                        row += [temp]
+        # rows are written in blocks of about 100 ms, filtered on the way
+        block = []
 
-                    row += [accel['ax'], accel['ay'], accel['az']]
-                    row += [gyro['gx'], gyro['gy'], gyro['gz']]
+        def flush():
+            records = np.array(block, dtype=reader.dtype)
+            del block[:]
+            if decimator is not None:
+                records = decimator.process(records)
+            if events is not None:
+                records = events.process(records)
+            if publisher is not None:
+                # a subscriber that falls behind costs it rows, not us
+                publisher.publish(records, copy=False)
+            log.write(records)
 
-                    if axis_10:
-                        mag = mpu.mpu_read_mag()
-                        row += [mag['mx'], mag['my'], mag['mz']]
-
-                    # sys.stdout.write('\r')
-                    # sys.stdout.write(str(row))
-                    # sys.stdout.flush()
+        try:
+            data_rows = 0
+            errors = 0
+            next_stats = time.monotonic() + args['stats']
+            while True:
+                try:
+                    try:
+                        row = reader.read()
+                        errors = 0
+                    except IOError:
+                        # a glitch on the bus costs a row, not the run
+                        errors += 1
+                        if stats is not None:
+                            stats.count('read_errors')
+                        if errors >= args['max_errors']:
+                            raise
+                        continue
+                    ts = row[0]
 
-                    writer.writerow(row)
+                    block.append(row)
+                    if len(block) >= block_rows:
+                        flush()
 
                     data_rows += 1
                     if data_rows % 10000 == 0:
-                        st = bg.get_datetime(ts).strftime('%Y-%m-%d_%H%M%S')
-                        print('[%s] %6d rows have been collected.' % (st, data_rows))
+                        st = stamp(ts)
+                        print('[%s] %6d rows have been collected, %d deadlines missed, writing "%s".'
+                              % (st, data_rows, sched.missed, log.path))
+                        if events is not None:
+                            print('[%s] %d motion events, %d rows logged.' % (st, events.events, events.written))
+
+                    if stats is not None and time.monotonic() >= next_stats:
+                        next_stats += args['stats']
+                        print('[%s] %s' % (stamp(ts), stats.status_line()))
 
                 except KeyboardInterrupt:
-                    f.close()
+                    if block:
+                        flush()
+                    log.close()
 
                     ts = time.time()
-                    st = bg.get_datetime(ts).strftime('%Y-%m-%d_%H%M%S')
-                    print('[%s] \"%s\" was saved.' % (st, start_st + '.csv'))
+                    st = stamp(ts)
+                    print('[%s] %d files were saved, \"%s\" is the last.' % (st, len(log.segments), log.segments[-1]))
 
                     break
+        finally:
+            log.close()
+            if publisher is not None:
+                publisher.close()
 
     except IOError:
-        print('Building CSV failed.')
+        print('Building the log failed.')
 
     return 0
 
@@ -0,0 +1,49 @@
+import beagle as bg
+import argparse
+import time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Receive the rows read10axis.py -P streams')
+    parser.add_argument('address', help='host:port of the board, or [host]:port to listen on with --udp')
+    parser.add_argument('--udp', help='receive over UDP instead of TCP', action='store_true')
+    parser.add_argument('-o', '--output', help='write the rows to this binary log')
+
+    args = parser.parse_args()
+    host, _, port = args.address.rpartition(':')
+    address = (host or ('' if args.udp else '127.0.0.1'), int(port or bg.STREAM_PORT))
+
+    sub = bg.StreamSubscriber(address, 'udp' if args.udp else 'tcp')
+    log = None
+    try:
+        last = time.monotonic()
+        rows = 0
+        for records in sub.batches(timeout=1.0):
+            if log is None and args.output:
+                # raw captures come with what CaptureDecoder needs in the meta
+                log = bg.BinLogWriter(args.output, sub.channels, sample_rate=sub.meta.get('rate'), meta=sub.meta)
+            if log is not None:
+                log.write(records)
+
+            rows += len(records)
+            now = time.monotonic()
+            if now - last >= 1.0:
+                print('%7.1f rows/s, %d rows, %d lost, %d frames lost, %d out of order'
+                      % (rows / (now - last), sub.records, sub.lost, sub.lost_frames, sub.reordered))
+                last = now
+                rows = 0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sub.close()
+        if log is not None:
+            log.close()
+
+    print('%d rows received, %d lost.' % (sub.records, sub.lost))
+
+    return 0
+
+
+if __name__ == '__main__':
+    main()